@@ -0,0 +1,66 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Rendered with the stdlib encoder instead
+    orjson = None
+
+from ..models.search import SearchResult
+
+SEARCH_RESULT_FIELDS = tuple(SearchResult.model_fields)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    A JSON response rendered with orjson when it is installed. Routes return it directly, which skips
+    FastAPI's validation and re-serialization through the response model, so callers build the payload
+    in the documented shape themselves.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def parse_fields(fields: Optional[Iterable[str]]) -> Optional[List[str]]:
+    """Validates a result field projection; None (or nothing requested) keeps every field."""
+    if fields is None:
+        return None
+    requested = [field.strip() for field in fields if field.strip()]
+    unknown = [field for field in requested if field not in SEARCH_RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown result fields: {', '.join(unknown)}. Choose from: {', '.join(SEARCH_RESULT_FIELDS)}.")
+    return requested or None
+
+
+def _snippet(text: Optional[str], length: int) -> Optional[str]:
+    """Shortens text to at most `length` characters, cutting at a word boundary when there is one."""
+    if text is None or len(text) <= length:
+        return text
+    cut = text[:length]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip() + "…"
+
+
+def search_response(search_data: Dict[str, Any], fields: Optional[List[str]] = None, snippet_length: Optional[int] = None) -> FastJSONResponse:
+    """
+    Renders a search service result as a SearchResponse body. Each result keeps only the requested
+    fields (all SearchResult fields by default), and abstracts are cut to snippet_length characters.
+    """
+    selected = fields or SEARCH_RESULT_FIELDS
+    results = []
+    for article in search_data["results"]:
+        result = {field: article.get(field) for field in selected}
+        if snippet_length is not None and "abstract" in result:
+            result["abstract"] = _snippet(result["abstract"], snippet_length)
+        results.append(result)
+    return FastJSONResponse({
+        "results": results,
+        "suggestion": search_data.get("suggestion"),
+        "total_results": search_data.get("total_results", 0),
+        "next_cursor": search_data.get("next_cursor"),
+    })
@@ -1,32 +1,74 @@
+import json
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Query, Body
-from ..services.search_service import hybrid_search, build_advanced_pubmed_query, generate_knowledge_graph
-from ..models.search import SearchResponse, AdvancedSearchRequest, KnowledgeGraphResponse, GraphRequest
+from fastapi.responses import StreamingResponse
+from .responses import parse_fields, search_response
+from ..services.search_service import hybrid_search, local_search, fused_search, paginated_search, stream_batch_search, build_advanced_pubmed_query, generate_knowledge_graph, stream_knowledge_graph
+from ..services.vector_store import vector_store
+from ..models.search import SearchResponse, AdvancedSearchRequest, BatchSearchRequest, KnowledgeGraphResponse, GraphRequest
 
 router = APIRouter()
 
-# --- Search Endpoints (Unchanged) ---
+# --- Search Endpoints ---
 @router.get("/search", response_model=SearchResponse, summary="Perform a simple search", tags=["Search"])
-async def search_pubmed(query: str = Query(..., min_length=3), top_k: int = Query(100, ge=20, le=200)):
+async def search_pubmed(
+    query: str = Query(..., min_length=3),
+    top_k: int = Query(100, ge=20, le=200),
+    mode: str = Query("pubmed", pattern="^(pubmed|local|fused)$", description="'pubmed' re-ranks live PubMed hits, 'local' queries the local index only, 'fused' combines both."),
+    page_size: Optional[int] = Query(None, ge=1, le=200, description="Paginate the results with this many per page (pubmed mode only); a cursor keeps its search's page size by default."),
+    cursor: Optional[str] = Query(None, description="The next_cursor of a previous page; continues that search."),
+    fields: Optional[str] = Query(None, description="Comma-separated result fields to return, e.g. 'pmid,title,score'; all fields by default."),
+    snippet_length: Optional[int] = Query(None, ge=1, description="Shorten abstracts to at most this many characters."),
+):
     if not query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
+    if mode != "pubmed" and not vector_store.is_loaded:
+        raise HTTPException(status_code=503, detail="The local search index is not available.")
+    paginate = page_size is not None or cursor is not None
+    if paginate and mode != "pubmed":
+        raise HTTPException(status_code=400, detail="Pagination is only supported in 'pubmed' mode.")
     try:
-        search_data = await hybrid_search(original_query=query, keyword_query=None, top_k=top_k, check_suggestion=True)
-        return search_data
+        selected_fields = parse_fields(fields.split(",") if fields is not None else None)
+        if paginate:
+            search_data = await paginated_search(query, None, page_size, cursor, check_suggestion=True)
+        elif mode == "local":
+            search_data = await local_search(query, top_k)
+        elif mode == "fused":
+            search_data = await fused_search(original_query=query, keyword_query=None, top_k=top_k, check_suggestion=True)
+        else:
+            search_data = await hybrid_search(original_query=query, keyword_query=None, top_k=top_k, check_suggestion=True)
+        return search_response(search_data, selected_fields, snippet_length)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.post("/advanced-search", response_model=SearchResponse, summary="Perform an advanced search", tags=["Search"])
 async def advanced_search_pubmed(request: AdvancedSearchRequest = Body(...)):
     try:
+        selected_fields = parse_fields(request.fields)
         keyword_query = build_advanced_pubmed_query(request.clauses)
         semantic_intent = " ".join([c.value for c in request.clauses])
-        search_data = await hybrid_search(original_query=semantic_intent, keyword_query=keyword_query, top_k=request.top_k, check_suggestion=False)
-        return search_data
+        if request.page_size is not None or request.cursor is not None:
+            search_data = await paginated_search(semantic_intent, keyword_query, request.page_size, request.cursor)
+        else:
+            search_data = await hybrid_search(original_query=semantic_intent, keyword_query=keyword_query, top_k=request.top_k, check_suggestion=False)
+        return search_response(search_data, selected_fields, request.snippet_length)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@router.post("/batch-search", summary="Run many searches and stream the results as NDJSON, one line per query", tags=["Search"])
+async def post_batch_search(request: BatchSearchRequest = Body(...)):
+    async def ndjson_lines():
+        # Each line is {"index", "id", "query", "results", "total_results"}, {"index", "id", "error"} for an invalid
+        # query, or {"index", "id", "query", "error"} for a query whose search or article fetch failed
+        async for result in stream_batch_search(request.queries, request.top_k):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 # --- REFACTORED: Knowledge Graph Endpoint ---
 @router.post("/knowledge-graph", response_model=KnowledgeGraphResponse, summary="Generate a knowledge graph from context", tags=["Graph"])
 async def post_knowledge_graph(request: GraphRequest = Body(...)):
@@ -36,3 +78,16 @@ async def post_knowledge_graph(request: GraphRequest = Body(...)):
         return await generate_knowledge_graph(request.context_text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate knowledge graph: {e}")
+
+@router.post("/knowledge-graph/stream", summary="Stream a knowledge graph as NDJSON, one update per finished article", tags=["Graph"])
+async def post_knowledge_graph_stream(request: GraphRequest = Body(...)):
+    if not request.context_text:
+        raise HTTPException(status_code=400, detail="Context text cannot be empty.")
+
+    async def ndjson_lines():
+        # Each line is {"nodes": [...], "links": [...]} holding only what the finished article added; in
+        # dictionary mode, relation updates also carry "removed_links", the co-occurrence links they replace
+        async for update in stream_knowledge_graph(request.context_text):
+            yield json.dumps(update) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import record_cache_lookup
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A size-bounded in-process LRU cache whose entries expire after `ttl` seconds.
+    Not thread-safe; it is meant to be used from the event loop. Lookups are counted
+    in the cache metrics when a name is given.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, name: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get(key, default)
+        if self.name is not None:
+            record_cache_lookup(self.name, int(value is not default), int(value is default))
+        return value
+
+    def _get(self, key: Hashable, default: Any) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+
+class SemanticCache:
+    """
+    A size-bounded cache keyed by embedding vectors instead of exact keys.
+
+    A lookup returns the value of the most similar live entry in the same namespace if its cosine
+    similarity reaches `threshold`. Entries occupy preallocated rows of one matrix, so a lookup is a
+    single matrix-vector product; expired rows are reused first, then the least recently used one.
+    Not thread-safe; it is meant to be used from the event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float, name: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.name = name
+        self._vectors: Optional[np.ndarray] = None  # Allocated on the first set, once the dimension is known
+        self._expires_at = np.zeros(max_entries)  # 0 marks an empty row
+        self._last_used = np.zeros(max_entries)
+        self._row_namespaces = np.full(max_entries, -1, dtype=np.int64)
+        self._namespace_ids: Dict[Hashable, int] = {}
+        self._values: list = [None] * max_entries
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _nearest(self, vector: np.ndarray, namespace: Hashable) -> Tuple[int, float]:
+        """Returns the row and similarity of the most similar live entry in the namespace, or (-1, -inf)."""
+        namespace_id = self._namespace_ids.get(namespace)
+        if self._vectors is None or namespace_id is None or self._vectors.shape[1] != len(vector):
+            return -1, float("-inf")
+        eligible = (self._expires_at >= time.monotonic()) & (self._row_namespaces == namespace_id)
+        if not eligible.any():
+            return -1, float("-inf")
+        similarities = np.where(eligible, self._vectors @ vector, -np.inf)
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+    def lookup(self, vector: np.ndarray, namespace: Hashable = None) -> Tuple[Any, float]:
+        """Returns the cached value (None on a miss) and the best similarity found."""
+        row, similarity = self._nearest(self._normalize(vector), namespace)
+        hit = row >= 0 and similarity >= self.threshold
+        if self.name is not None:
+            record_cache_lookup(self.name, int(hit), int(not hit))
+        if not hit:
+            return None, similarity
+        self._last_used[row] = time.monotonic()
+        return self._values[row], similarity
+
+    def set(self, vector: np.ndarray, value: Any, namespace: Hashable = None) -> None:
+        vector = self._normalize(vector)
+        if self._vectors is None or self._vectors.shape[1] != len(vector):
+            self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            self._expires_at[:] = 0
+        now = time.monotonic()
+        # A near-duplicate replaces the existing entry rather than taking another row
+        row, similarity = self._nearest(vector, namespace)
+        if row < 0 or similarity < self.threshold:
+            free = np.flatnonzero(self._expires_at < now)
+            row = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+        self._vectors[row] = vector
+        self._expires_at[row] = now + self.ttl
+        self._last_used[row] = now
+        self._row_namespaces[row] = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+        self._values[row] = value
+
+    def clear(self) -> None:
+        self._expires_at[:] = 0
+        self._values = [None] * self.max_entries
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._expires_at >= time.monotonic()))
+
+
+SQLITE_IN_CHUNK_SIZE = 500  # Stays below SQLite's limit on bound parameters
+
+def select_in_chunks(conn: sqlite3.Connection, query: str, values: Sequence[Any], params: Sequence[Any] = ()) -> List[tuple]:
+    """
+    Runs a `... IN ({placeholders})` query once per chunk of `values` and returns every row. Each
+    chunk's values are bound to the placeholders, followed by `params`. Callers hold any lock.
+    """
+    rows: List[tuple] = []
+    for i in range(0, len(values), SQLITE_IN_CHUNK_SIZE):
+        chunk = values[i:i + SQLITE_IN_CHUNK_SIZE]
+        rows += conn.execute(query.format(placeholders=",".join("?" * len(chunk))), (*chunk, *params)).fetchall()
+    return rows
+
+
+class SqliteCache:
+    """
+    A persistent key/value cache backed by SQLite. Values are stored as JSON with an
+    absolute expiry time, so entries survive restarts until their TTL runs out.
+    Calls block on disk I/O and are safe to run from worker threads. The database is only
+    created on first use, so defining a cache at import time writes nothing to disk.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Opens the database on first use; callers hold the lock."""
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        now = time.time()
+        with self._lock:
+            rows = select_in_chunks(
+                self._connection(), "SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at >= ?", keys, (now,)
+            )
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), expires_at) for key, value in items.items()],
+            )
+            conn.commit()
+
+    def purge_expired(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TieredCache:
+    """
+    An in-process TTLCache in front of an optional SqliteCache; disk hits are promoted to memory.
+    Entries are written to both tiers with the memory tier's TTL, and lookups are counted under `name`.
+    """
+
+    def __init__(self, memory: TTLCache, disk: Optional[SqliteCache] = None, name: str = "tiered"):
+        self.memory = memory
+        self.disk = disk
+        self.name = name
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        found, missing = {}, []
+        for key in keys:
+            value = self.memory.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing and self.disk is not None:
+            from_disk = await asyncio.to_thread(self.disk.get_many, missing)
+            for key, value in from_disk.items():
+                self.memory.set(key, value)
+            found.update(from_disk)
+        record_cache_lookup(self.name, len(found), len(keys) - len(found))
+        return found
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return (await self.get_many([key])).get(key, default)
+
+    async def set_many(self, items: Dict[str, Any]) -> None:
+        for key, value in items.items():
+            self.memory.set(key, value)
+        if items and self.disk is not None:
+            await asyncio.to_thread(self.disk.set_many, items, self.memory.ttl)
+
+    async def set(self, key: str, value: Any) -> None:
+        await self.set_many({key: value})
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: while a call for a key is in flight, later callers
+    await the same result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shielded so one caller being cancelled does not cancel the call for everyone else
+        return await asyncio.shield(call)
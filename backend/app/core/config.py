@@ -1,4 +1,6 @@
 import os
+from typing import Literal
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -12,17 +14,95 @@ class Settings(BaseSettings):
     # PubMed API Configuration
     PUBMED_API_KEY: str = os.getenv("PUBMED_API_KEY", "")
     PUBMED_API_BASE_URL: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+    # NCBI allows 3 requests/second without an API key and 10 with one; 0 picks the matching limit
+    PUBMED_REQUESTS_PER_SECOND: float = 0
+    PUBMED_EFETCH_BATCH_SIZE: int = 200
+    PUBMED_ESUMMARY_BATCH_SIZE: int = 500
+
+    # PubMed HTTP Client Configuration (one pooled client per worker, opened and closed with the app)
+    PUBMED_HTTP2: bool = True  # Multiplexes concurrent efetch batches over one connection; needs the h2 package
+    PUBMED_HTTP_MAX_CONNECTIONS: int = 20
+    PUBMED_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    PUBMED_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    PUBMED_HTTP_TIMEOUT_SECONDS: float = 30.0
+    PUBMED_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+
+    # PubMed Result Cache Configuration
+    PUBMED_CACHE_ENABLED: bool = True
+    PUBMED_CACHE_MAX_ENTRIES: int = 50000  # Per in-process tier (esearch results and article records)
+    PUBMED_SEARCH_CACHE_TTL_SECONDS: int = 3600
+    PUBMED_ARTICLE_CACHE_TTL_SECONDS: int = 86400
+    PUBMED_CACHE_DB_PATH: str = ""  # Optional SQLite file for a persistent second tier, e.g. "data/pubmed_cache.sqlite3"
 
     # --- Gemini API Configuration (for all AI tasks) ---
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     GEMINI_EMBEDDING_MODEL: str = "models/embedding-001"
     GEMINI_GENERATIVE_MODEL: str = "gemini-1.5-flash-latest"
+    GEMINI_TIMEOUT_SECONDS: float = 60.0  # Per call, for generation and embedding requests
+
+    # Vector Index Configuration (paths are relative to the backend directory, as written by scripts/index_data.py)
+    LOCAL_INDEX_ENABLED: bool = True
+    VECTOR_INDEX_PATH: str = "data/faiss_index.index"
+    VECTOR_METADATA_PATH: str = "data/indexed_articles.sqlite3"  # Article store, one row per index vector
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    VECTOR_FULL_PRECISION_PATH: str = "data/index_vectors.f32"  # float32 copies of the index vectors for exact re-scoring
+    LOCAL_RESCORE_FACTOR: int = 4  # Quantized indexes fetch top_k * factor candidates, re-scored exactly
+    LOCAL_IVF_NPROBE: int = Field(32, ge=1)  # Inverted lists scanned per query by IVF-PQ indexes (faiss defaults to 1)
+    LOCAL_HNSW_EF_SEARCH: int = Field(128, ge=1)  # Candidate list size of HNSW searches (faiss defaults to 16)
+    FAISS_MMAP: bool = True  # Map the index read-only so every worker shares the same page-cache copy
 
-    # Vector Index Configuration
-    VECTOR_INDEX_PATH: str = "backend/data/vector_index.faiss"
+    # Startup Configuration
+    WARMUP_ENABLED: bool = True  # Load local models and page in the index after startup; /ready reports when done
 
     # Search Configuration
     INITIAL_RETRIEVAL_SIZE: int = 100
+    SUGGESTION_MIN_HITS: int = 5  # Below this many hits for the original query, the suggested query is searched instead
+    SUGGESTION_CACHE_TTL_SECONDS: int = 3600
+    SUGGESTION_CACHE_MAX_ENTRIES: int = 10000
+    SEARCH_PAGE_SIZE: int = 20  # Default page size when a search is paginated
+    SEARCH_CANDIDATE_POOL_SIZE: int = 1000  # PubMed hits ranked per paginated search
+    SEARCH_CURSOR_TTL_SECONDS: int = 1800  # How long a paginated search can be continued
+    SEARCH_CURSOR_MAX_ENTRIES: int = 1000  # Per in-process tier
+    SEARCH_CURSOR_DB_PATH: str = "data/search_cursors.sqlite3"  # Shared by all workers on a host; empty keeps cursors per process
+    BATCH_SEARCH_CHUNK_SIZE: int = 25  # Batch search queries whose details and embeddings are fetched together
+    RRF_K: int = 60  # Rank constant for reciprocal rank fusion of local and PubMed results
+
+    # Response Compression Configuration (brotli when the optional brotli package is installed, else gzip)
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024  # Smaller bodies are sent as is
+
+    # Semantic Query Cache Configuration (reuses re-ranked results for paraphrased queries)
+    SEMANTIC_CACHE_ENABLED: bool = False  # Off by default: a hit returns another query's results
+    SEMANTIC_CACHE_THRESHOLD: float = 0.98  # Minimum cosine similarity between query embeddings for a hit
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 10000
+
+    # Two-Stage Re-ranking Configuration
+    PRERANK_METHOD: Literal["", "bm25", "local"] = ""  # "bm25" or "local" (SentenceTransformer) scores every candidate first; empty disables the stage
+    PRERANK_TOP_N: int = 50  # Candidates passed on to the document embedder
+    PRERANK_RECALL_SAMPLE_RATE: float = 0.0  # Fraction of searches that also embed every candidate to measure pre-rank recall
+    PRERANK_RECALL_K: int = 10  # Recall is measured over the full re-ranking's top K
+
+    # Knowledge Graph Configuration
+    GRAPH_MAX_CONCURRENCY: int = 5  # Articles extracted in parallel per request
+    GRAPH_CACHE_TTL_SECONDS: int = 86400
+    GRAPH_CACHE_MAX_ENTRIES: int = 5000
+    GRAPH_EXTRACTION_METHOD: Literal["llm", "dictionary"] = "llm"  # "llm" extracts entities with Gemini; "dictionary" tags vocabulary terms locally and links co-occurring ones
+    GRAPH_VOCABULARY_PATH: str = ""  # Vocabulary file for "dictionary" extraction; empty uses app/resources/biomedical_vocabulary.tsv
+    GRAPH_RELATION_LABELING: bool = True  # In "dictionary" mode, ask Gemini to name the relation behind each co-occurrence link
+    GRAPH_RELATION_TIMEOUT_SECONDS: float = 0.0  # How long /knowledge-graph waits for uncached labels; 0 returns co-occurrence links at once
+    GRAPH_RELATION_STREAM_TIMEOUT_SECONDS: float = 10.0  # How long /knowledge-graph/stream keeps sending label updates after the co-occurrence graph
+
+    # Embedding Backend Configuration
+    EMBEDDING_BACKEND: Literal["gemini", "local"] = "gemini"  # "gemini" or "local" (SentenceTransformer) for re-ranking PubMed results
+    EMBEDDING_MAX_BATCH_SIZE: int = 256  # Concurrent requests are coalesced up to this many texts
+    EMBEDDING_BATCH_DELAY_SECONDS: float = 0.01  # How long a request waits for others to join its batch
+    LOCAL_EMBEDDING_WORKERS: int = 1
+
+    # Embedding Cache Configuration
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "data/embedding_cache"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 50000
 
     class Config:
         env_file = ".env"
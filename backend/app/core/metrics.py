@@ -0,0 +1,154 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# A minimal Prometheus-style registry: histograms and counters keyed by label values,
+# rendered in the text exposition format by render_metrics().
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, total = self._values.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels((*self.labels, 'le'), (*label_values, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+stage_duration = Histogram("search_stage_duration_seconds", "Duration of each search, graph and upstream stage.", ("stage",))
+http_request_duration = Histogram("http_request_duration_seconds", "End-to-end duration of API requests.", ("method", "path", "status"))
+cache_requests = Counter("cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result"))
+upstream_errors = Counter("upstream_errors_total", "Failed upstream calls by service and error type.", ("service", "error"))
+upstream_retries = Counter("upstream_retries_total", "Upstream calls retried by tenacity.", ("service",))
+prerank_recall = Histogram(
+    "prerank_recall", "Share of the full re-ranking's top results kept by the pre-ranker, on sampled searches.", ("method",),
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0),
+)
+
+_REGISTRY = (stage_duration, http_request_duration, cache_requests, upstream_errors, upstream_retries, prerank_recall)
+
+
+def record_cache_lookup(cache: str, hits: int, misses: int) -> None:
+    if hits:
+        cache_requests.inc(cache, "hit", amount=hits)
+    if misses:
+        cache_requests.inc(cache, "miss", amount=misses)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+
+    # Hit ratios are derivable from cache_requests_total, but exported directly for convenience
+    lines += ["# HELP cache_hit_ratio Fraction of cache lookups served from the cache.", "# TYPE cache_hit_ratio gauge"]
+    caches = sorted({label_values[0] for label_values in cache_requests._values})
+    for cache in caches:
+        hits, misses = cache_requests.value(cache, "hit"), cache_requests.value(cache, "miss")
+        lines.append(f'cache_hit_ratio{{cache="{cache}"}} {hits / (hits + misses) if hits + misses else 0.0}')
+    return "\n".join(lines) + "\n"
+
+
+# --- Request route labels ---
+# Routers included with a prefix keep their routes' own path templates ("/search"), so the full
+# mounted template is recorded per route object when the router is included.
+_route_labels: Dict[int, str] = {}
+
+def register_route_prefix(routes: List[object], prefix: str) -> None:
+    """Labels each route's requests with `prefix` + its path template, e.g. "/api/v1/search"."""
+    for route in routes:
+        path_format = getattr(route, "path_format", None)
+        if path_format is not None:
+            _route_labels[id(route)] = prefix + path_format
+
+def route_label(route: Optional[object]) -> str:
+    """The matched route's full path template, or "unmatched"; keeps the number of series bounded."""
+    if route is None:
+        return "unmatched"
+    return _route_labels.get(id(route)) or getattr(route, "path_format", "unmatched")
+
+
+# --- Per-request stage timings (reported in the Server-Timing header) ---
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def start_request_timings() -> Dict[str, float]:
+    """Starts collecting stage timings for the current request; tasks created afterwards share the same dict."""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Records a stage duration in the histogram and adds it to the current request's timings."""
+    stage_duration.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times the enclosed block as one stage; works around both sync and async code."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Formats timings as a Server-Timing header value. Stages that ran concurrently are summed per stage."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -1,12 +1,35 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .api import routes
+from .core.compression import CompressionMiddleware
+from .core.config import settings
+from .core.metrics import format_server_timing, http_request_duration, register_route_prefix, render_metrics, route_label, start_request_timings
+from .services.embedding_service import close_embedders
+from .services.gemini_client import close_gemini_client, start_gemini_client
+from .services.pubmed_service import close_http_client, start_http_client
+from .services.warmup import readiness, start_warmup, stop_warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pooled upstream clients, then load the local FAISS index and models in the background
+    await start_http_client()
+    await start_gemini_client()
+    start_warmup()
+    yield
+    await stop_warmup()
+    await close_embedders()
+    await close_gemini_client()
+    await close_http_client()
 
 # Create the FastAPI app instance
 app = FastAPI(
     title="PubMed Semantic Search API",
     description="An API for semantically searching PubMed articles.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS (Cross-Origin Resource Sharing) to allow the frontend to connect
@@ -22,9 +45,27 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Compress large JSON bodies; registered before the timing middleware so compression time counts towards "total"
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
+# Time every request and report its per-stage timings in a Server-Timing header
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    timings["total"] = elapsed
+    response.headers["Server-Timing"] = format_server_timing(timings)
+    # Label by route template rather than raw path to keep the number of series bounded
+    http_request_duration.observe(elapsed, request.method, route_label(request.scope.get("route")), str(response.status_code))
+    return response
+
 # Include the API router from the api/routes.py file
 # This will add all endpoints defined in that router to the application
 app.include_router(routes.router, prefix="/api/v1")
+register_route_prefix(routes.router.routes, "/api/v1")
 
 # Define a root endpoint for a simple health check
 @app.get("/", tags=["Health Check"])
@@ -34,3 +75,15 @@ def read_root():
     """
     return {"status": "ok", "message": "PubMed Semantic Search API is running"}
 
+
+# Readiness probe: unlike the health check above, it only succeeds once the local index and models are warm
+@app.get("/ready", tags=["Health Check"])
+def read_ready():
+    ready, components = readiness()
+    return JSONResponse({"status": "ready" if ready else "starting", "components": components}, status_code=200 if ready else 503)
+
+
+# Prometheus scrape endpoint with stage latency histograms, cache hit ratios and upstream error counts
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
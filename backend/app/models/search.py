@@ -8,6 +8,7 @@ class SearchResult(BaseModel):
     abstract: Optional[str] = Field(None, description="The abstract of the article.")
     url: str = Field(..., description="The direct URL to the article on PubMed.")
     authors: str = Field(..., description="A comma-separated list of authors.")
+    year: Optional[int] = Field(None, description="The publication year, if known.")
     score: Optional[float] = Field(None, description="The semantic similarity score.")
 
 class AdvancedSearchClause(BaseModel):
@@ -18,11 +19,25 @@ class AdvancedSearchClause(BaseModel):
 class AdvancedSearchRequest(BaseModel):
     clauses: List[AdvancedSearchClause] = Field(..., min_items=1, description="A list of search clauses.")
     top_k: int = Field(100, ge=20, le=200, description="The number of top results to retrieve for ranking.")
+    page_size: Optional[int] = Field(None, ge=1, le=200, description="Paginate the results with this many per page; a cursor keeps its search's page size by default.")
+    cursor: Optional[str] = Field(None, description="The next_cursor of a previous page; continues that search.")
+    fields: Optional[List[str]] = Field(None, description="Result fields to return, e.g. ['pmid', 'title', 'score']; all fields by default.")
+    snippet_length: Optional[int] = Field(None, ge=1, description="Shorten abstracts to at most this many characters.")
+
+class BatchSearchQuery(BaseModel):
+    id: Optional[str] = Field(None, description="A caller-chosen identifier echoed back with this query's results.")
+    query: Optional[str] = Field(None, description="A simple search query.")
+    clauses: Optional[List[AdvancedSearchClause]] = Field(None, description="Advanced search clauses, used instead of query.")
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchQuery] = Field(..., min_items=1, max_items=1000, description="The queries to run.")
+    top_k: int = Field(100, ge=20, le=200, description="The number of top results to retrieve for ranking, per query.")
 
 class SearchResponse(BaseModel):
     results: List[SearchResult] = Field(..., description="A list of search result items.")
     suggestion: Optional[str] = Field(None, description="A search query suggestion, if available.")
     total_results: int = Field(0, description="The total number of results found for the query.")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page of a paginated search; null on the last page.")
 
 # --- Models for Knowledge Graph ---
 class GraphNode(BaseModel):
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from ..core.cache import select_in_chunks
+
+
+class ArticleStore:
+    """
+    Metadata for the local index, stored in SQLite with one row per FAISS vector.
+
+    `row_id` is the position of the article's vector in the index, so search hits are looked up
+    by primary key and PMIDs through a unique index, without loading the table into memory.
+    Reads go through a memory-mapped view of the database file. Calls block on disk I/O and
+    are safe to run from worker threads.
+    """
+
+    MMAP_SIZE = 1 << 30
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                "row_id INTEGER PRIMARY KEY, pmid TEXT NOT NULL UNIQUE, title TEXT NOT NULL, "
+                "abstract TEXT NOT NULL, authors TEXT NOT NULL, year INTEGER)"
+            )
+            self._conn.commit()
+        self._conn.execute(f"PRAGMA mmap_size={self.MMAP_SIZE}")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        # Row ids are dense, so this avoids a COUNT(*) scan
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(row_id) + 1, 0) FROM articles").fetchone()[0]
+
+    @staticmethod
+    def _to_article(row: tuple) -> Dict[str, Any]:
+        pmid, title, abstract, authors, year = row
+        return {
+            "pmid": pmid,
+            "title": title,
+            "abstract": abstract,
+            "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            "authors": authors,
+            "year": year,
+        }
+
+    def _select(self, column: str, values: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        with self._lock:
+            rows = select_in_chunks(
+                self._conn, f"SELECT {column}, pmid, title, abstract, authors, year FROM articles WHERE {column} IN ({{placeholders}})", values
+            )
+        return {row[0]: self._to_article(row[1:]) for row in rows}
+
+    def get_rows(self, row_ids: Iterable[int]) -> List[Optional[Dict[str, Any]]]:
+        """Returns the article stored at each row id, in the given order (None for unknown ids)."""
+        row_ids = [int(row_id) for row_id in row_ids]
+        found = self._select("row_id", row_ids)
+        return [found.get(row_id) for row_id in row_ids]
+
+    def get_by_pmids(self, pmids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Returns the stored articles among the given PMIDs, keyed by PMID."""
+        return self._select("pmid", list(pmids))
+
+    def existing_pmids(self, pmids: Iterable[str]) -> Set[str]:
+        with self._lock:
+            rows = select_in_chunks(self._conn, "SELECT pmid FROM articles WHERE pmid IN ({placeholders})", list(pmids))
+        return {row[0] for row in rows}
+
+    def append(self, articles: List[Dict[str, Any]]) -> None:
+        """Appends articles at the next row ids, in order, in one transaction."""
+        with self._lock:
+            start = self._conn.execute("SELECT COALESCE(MAX(row_id) + 1, 0) FROM articles").fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO articles (row_id, pmid, title, abstract, authors, year) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (start + i, a["pmid"], a.get("title") or "No title available", a.get("abstract", ""),
+                     a.get("authors") or "No authors listed", a.get("year"))
+                    for i, a in enumerate(articles)
+                ],
+            )
+            self._conn.commit()
+
+    def truncate(self, row_count: int) -> None:
+        """Drops every row at or after row_count."""
+        with self._lock:
+            self._conn.execute("DELETE FROM articles WHERE row_id >= ?", (row_count,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,40 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    Scores each document against the query with Okapi BM25, using the documents themselves as the corpus.
+    Runs in time linear in the total document length; only query terms are ever looked up.
+    """
+    query_terms = set(tokenize(query))
+    scores = np.zeros(len(documents), dtype=np.float32)
+    if not query_terms or not documents:
+        return scores
+
+    term_counts = []
+    lengths = np.empty(len(documents), dtype=np.float32)
+    for i, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths[i] = len(tokens)
+        term_counts.append(Counter(token for token in tokens if token in query_terms))
+    length_norms = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+
+    for term in query_terms:
+        tf = np.array([counts.get(term, 0) for counts in term_counts], dtype=np.float32)
+        df = int(np.count_nonzero(tf))
+        if not df:
+            continue
+        idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        scores += idf * tf * (k1 + 1) / (tf + length_norms)
+    return scores
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..core.cache import select_in_chunks
+from ..core.config import settings
+
+
+def make_cache_key(model: str, task_type: str, text: str) -> str:
+    """Builds a content-addressed key from the embedding model, task type and text hash."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}|{task_type}|{text_hash}"
+
+
+class EmbeddingCache:
+    """
+    A persistent, size-bounded embedding store shared by every worker process.
+
+    Each vector is stored as a float32 blob in a SQLite table next to its key, so a key and its
+    vector are always written in the same transaction. WAL mode lets workers read while one of
+    them writes. Hits refresh an entry's last-used time in memory; those times are written with
+    the next insert, or once TOUCH_FLUSH_SIZE hits or TOUCH_FLUSH_SECONDS have accumulated, so
+    lookups are normally read-only. Triggers keep the entry count in a one-row table, and when
+    the cache is over capacity the least recently used entries are deleted. Calls block on disk
+    I/O and are meant for worker threads.
+    """
+
+    DB_FILE = "embeddings.sqlite3"
+    TOUCH_FLUSH_SIZE = 1000
+    TOUCH_FLUSH_SECONDS = 60.0
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._last_touch_flush = time.monotonic()
+        # Waits for other processes' write transactions instead of failing with "database is locked"
+        self._conn = sqlite3.connect(os.path.join(directory, self.DB_FILE), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode this only gives up durability of the last commits on power loss, never consistency
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entry_count (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO entry_count (id, entries) SELECT 0, COUNT(*) FROM embeddings")
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings BEGIN UPDATE entry_count SET entries = entries + 1; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings BEGIN UPDATE entry_count SET entries = entries - 1; END"
+            )
+            self._conn.commit()
+            count = self._entry_count()
+        if count:
+            print(f"[EMBED CACHE] Found {count} cached embeddings in {directory}.")
+
+    def _entry_count(self) -> int:
+        return self._conn.execute("SELECT entries FROM entry_count").fetchone()[0]
+
+    def _write_touches(self) -> None:
+        """Writes the buffered last-used times inside the caller's transaction; callers hold the lock."""
+        if self._touched:
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+        self._last_touch_flush = time.monotonic()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Returns the cached vector for each key, or None where the key is missing."""
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            rows = select_in_chunks(self._conn, "SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", unique_keys)
+            found.update((key, np.frombuffer(vector, dtype=np.float32).copy()) for key, vector in rows)
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= self.TOUCH_FLUSH_SIZE or time.monotonic() - self._last_touch_flush >= self.TOUCH_FLUSH_SECONDS:
+                self._write_touches()
+                self._conn.commit()
+        return [found.get(key) for key in keys]
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        """Stores vectors under their keys, evicting the least recently used entries if full."""
+        if not len(keys):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._write_touches()
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the count trigger
+            self._conn.executemany(
+                "INSERT INTO embeddings (key, vector, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+                [(key, vector.tobytes(), now) for key, vector in zip(keys, vectors)],
+            )
+            excess = self._entry_count() - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_touches()
+            self._conn.commit()
+            self._conn.close()
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+
+def get_embedding_cache(model: str) -> Optional[EmbeddingCache]:
+    """Returns the shared cache for an embedding model (each model has its own dimension), or None if disabled."""
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if model not in _caches:
+        directory = os.path.join(settings.EMBEDDING_CACHE_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model))
+        _caches[model] = EmbeddingCache(directory, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+    return _caches[model]
@@ -0,0 +1,209 @@
+import asyncio
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import record_cache_lookup, span, upstream_errors
+from .embedding_cache import get_embedding_cache, make_cache_key
+from .gemini_client import REQUEST_OPTIONS
+
+
+class EmbeddingBackend(ABC):
+    """Interface for embedding providers; implementations must not block the event loop."""
+
+    model_name: str
+
+    @abstractmethod
+    async def embed(self, texts: List[str], task_type: str) -> np.ndarray:
+        """Returns a float32 matrix with one embedding row per text."""
+
+    async def warm_up(self) -> None:
+        """Loads models ahead of the first request."""
+
+    async def close(self) -> None:
+        """Releases any resources held by the backend."""
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """Embeds with the Gemini API using its async client, sending request chunks concurrently."""
+
+    MAX_BATCH_SIZE = 100  # Gemini's limit on texts per batchEmbedContents call
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    async def _embed_chunk(self, texts: List[str], task_type: str) -> List[List[float]]:
+        try:
+            with span("gemini_embed"):
+                response = await genai.embed_content_async(
+                    model=self.model_name, content=texts, task_type=task_type, request_options=REQUEST_OPTIONS
+                )
+        except Exception as e:
+            upstream_errors.inc("gemini", type(e).__name__)
+            raise
+        return response["embedding"]
+
+    async def embed(self, texts: List[str], task_type: str) -> np.ndarray:
+        chunks = await asyncio.gather(*(
+            self._embed_chunk(texts[i:i + self.MAX_BATCH_SIZE], task_type)
+            for i in range(0, len(texts), self.MAX_BATCH_SIZE)
+        ))
+        return np.array([vector for chunk in chunks for vector in chunk], dtype=np.float32)
+
+
+# SentenceTransformer models are loaded once per worker process by the pool initializer
+_worker_model = None
+
+def _init_local_worker(model_name: str) -> None:
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """Embeds with a local SentenceTransformer running in a separate process pool."""
+
+    def __init__(self, model_name: str, workers: int):
+        self.model_name = model_name
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" avoids forking a process that already holds threads and event-loop state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_local_worker,
+                initargs=(self.model_name,),
+            )
+        return self._executor
+
+    async def embed(self, texts: List[str], task_type: str) -> np.ndarray:
+        # The symmetric MiniLM models used locally ignore task_type
+        loop = asyncio.get_running_loop()
+        with span("local_embed"):
+            return await loop.run_in_executor(self._get_executor(), _encode_in_worker, texts)
+
+    async def warm_up(self) -> None:
+        # One call per worker slot, so the pool starts its processes and each loads the model
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _encode_in_worker, ["warm-up"]) for _ in range(self.workers)))
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent embedding requests into shared backend calls.
+
+    Requests with the same task type that arrive within `max_delay` seconds of each other
+    (or until `max_batch_size` texts are queued) are sent as one deduplicated batch.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_batch_size: int, max_delay: float):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: Dict[str, List[Tuple[List[str], asyncio.Future]]] = {}
+        self._pending_sizes: Dict[str, int] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    async def embed(self, texts: List[str], task_type: str) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(task_type, []).append((texts, future))
+        self._pending_sizes[task_type] = self._pending_sizes.get(task_type, 0) + len(texts)
+        if self._pending_sizes[task_type] >= self.max_batch_size:
+            self._flush(task_type)
+        elif task_type not in self._timers:
+            self._timers[task_type] = loop.call_later(self.max_delay, self._flush, task_type)
+        return await future
+
+    def _flush(self, task_type: str) -> None:
+        timer = self._timers.pop(task_type, None)
+        if timer is not None:
+            timer.cancel()
+        requests = self._pending.pop(task_type, [])
+        self._pending_sizes.pop(task_type, None)
+        if requests:
+            task = asyncio.create_task(self._run_batch(task_type, requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, task_type: str, requests: List[Tuple[List[str], asyncio.Future]]) -> None:
+        try:
+            unique_texts = list(dict.fromkeys(text for texts, _ in requests for text in texts))
+            vectors = await self.backend.embed(unique_texts, task_type)
+            if len(vectors) != len(unique_texts):
+                raise ValueError(f"{self.model_name} returned {len(vectors)} embeddings for {len(unique_texts)} texts")
+            rows = {text: i for i, text in enumerate(unique_texts)}
+            for texts, future in requests:
+                if not future.done():
+                    future.set_result(vectors[[rows[text] for text in texts]])
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Only reached with unresolved futures if the batch itself was cancelled
+            for _, future in requests:
+                if not future.done():
+                    future.cancel()
+
+    async def warm_up(self) -> None:
+        await self.backend.warm_up()
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+gemini_embedder = MicroBatcher(
+    GeminiEmbeddingBackend(settings.GEMINI_EMBEDDING_MODEL), settings.EMBEDDING_MAX_BATCH_SIZE, settings.EMBEDDING_BATCH_DELAY_SECONDS
+)
+local_embedder = MicroBatcher(
+    LocalEmbeddingBackend(settings.LOCAL_EMBEDDING_MODEL, settings.LOCAL_EMBEDDING_WORKERS), settings.EMBEDDING_MAX_BATCH_SIZE, settings.EMBEDDING_BATCH_DELAY_SECONDS
+)
+# The backend used to re-rank PubMed results; the local index always uses local_embedder
+document_embedder = local_embedder if settings.EMBEDDING_BACKEND == "local" else gemini_embedder
+
+
+async def embed_texts(texts: List[str], task_type: str, embedder: MicroBatcher = document_embedder) -> np.ndarray:
+    """Embeds the given texts, sending only texts missing from the embedding cache to the backend."""
+    embedding_cache = get_embedding_cache(embedder.model_name)
+    if embedding_cache is None or not texts:
+        return await embedder.embed(texts, task_type)
+    keys = [make_cache_key(embedder.model_name, task_type, text) for text in texts]
+    vectors = await asyncio.to_thread(embedding_cache.get_many, keys)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    record_cache_lookup("embedding", len(texts) - len(missing), len(missing))
+    if missing:
+        new_vectors = await embedder.embed([texts[i] for i in missing], task_type)
+        await asyncio.to_thread(embedding_cache.put_many, [keys[i] for i in missing], new_vectors)
+        for i, vector in zip(missing, new_vectors):
+            vectors[i] = vector
+    return np.vstack(vectors)
+
+
+async def close_embedders() -> None:
+    await gemini_embedder.close()
+    await local_embedder.close()
@@ -0,0 +1,137 @@
+import os
+import re
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+# Starter vocabulary shipped with the app, used when GRAPH_VOCABULARY_PATH is empty
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "biomedical_vocabulary.tsv")
+
+
+class Entity(NamedTuple):
+    name: str  # Canonical name, used as the graph node id
+    group: str  # Entity type, e.g. "Disease" or "Gene"
+
+
+class EntityMatcher:
+    """
+    An Aho-Corasick automaton over a vocabulary of entity names and synonyms.
+
+    One pass over the text finds every vocabulary term, whatever the vocabulary size. Matching is
+    case-insensitive, except for terms written entirely in capitals and digits (gene symbols such as
+    "TP53"), which must match exactly. Only whole words are reported, and overlapping matches are
+    resolved leftmost-longest.
+    """
+
+    def __init__(self, terms: Dict[str, Entity]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Terms ending at each state: (length, term as written, entity)
+        self._outputs: List[List[Tuple[int, str, Entity]]] = [[]]
+        self._term_count = len(terms)
+        for term, entity in terms.items():
+            self._add(term, entity)
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return self._term_count
+
+    def _add(self, term: str, entity: Entity) -> None:
+        state = 0
+        # Characters are lowercased one by one so match offsets line up with the original text
+        for char in map(str.lower, term):
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(term), term, entity))
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    @staticmethod
+    def _is_case_sensitive(term: str) -> bool:
+        return term.upper() == term and any(char.isalpha() for char in term)
+
+    def find(self, text: str) -> List[Tuple[int, int, Entity]]:
+        """Returns (start, end, entity) for each whole-word match, in text order, without overlaps."""
+        matches = []
+        state = 0
+        for end, char in enumerate(map(str.lower, text), start=1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, term, entity in self._outputs[state]:
+                start = end - length
+                if start > 0 and text[start - 1].isalnum() or end < len(text) and text[end].isalnum():
+                    continue
+                if self._is_case_sensitive(term) and text[start:end] != term:
+                    continue
+                matches.append((start, end, entity))
+
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected, covered_until = [], 0
+        for start, end, entity in matches:
+            if start >= covered_until:
+                selected.append((start, end, entity))
+                covered_until = end
+        return selected
+
+
+def load_vocabulary(path: str) -> EntityMatcher:
+    """
+    Builds a matcher from a tab-separated vocabulary file with one entity per line:
+    `name<TAB>group[<TAB>synonym|synonym|...]`. Blank lines and lines starting with `#` are skipped.
+    """
+    terms: Dict[str, Entity] = {}
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) < 2 or not fields[0].strip() or not fields[1].strip():
+                raise ValueError(f"{path}:{line_number}: expected 'name<TAB>group[<TAB>synonyms]'")
+            entity = Entity(fields[0].strip(), fields[1].strip())
+            synonyms = fields[2].split("|") if len(fields) > 2 else []
+            for term in [entity.name, *synonyms]:
+                term = term.strip()
+                if term:
+                    terms.setdefault(term, entity)
+    return EntityMatcher(terms)
+
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Returns the (start, end) span of each sentence in the text."""
+    spans, start = [], 0
+    for boundary in _SENTENCE_END_RE.finditer(text):
+        spans.append((start, boundary.start()))
+        start = boundary.end()
+    spans.append((start, len(text)))
+    return spans
+
+
+_matchers: Dict[str, EntityMatcher] = {}
+
+def get_entity_matcher(path: str = "") -> EntityMatcher:
+    """Returns the matcher for the vocabulary file (default: the starter vocabulary), built on first use per file."""
+    path = path or DEFAULT_VOCABULARY_PATH
+    if path not in _matchers:
+        _matchers[path] = load_vocabulary(path)
+        print(f"[GRAPH] Loaded {len(_matchers[path])} vocabulary terms from {path}.")
+    return _matchers[path]
@@ -0,0 +1,49 @@
+from typing import Any, Dict, Optional
+
+import google.generativeai as genai
+from google.generativeai.client import get_default_generative_async_client
+
+from ..core.config import settings
+
+# One GenerativeModel per process; genai caches the underlying gRPC clients, so every call
+# made through it (and through genai.embed_content_async) shares one HTTP/2 gRPC channel per worker.
+_generative_model: Optional[genai.GenerativeModel] = None
+_async_client = None
+
+# Passed to every Gemini call so a stalled request fails instead of holding a worker
+REQUEST_OPTIONS: Dict[str, Any] = {"timeout": settings.GEMINI_TIMEOUT_SECONDS}
+
+
+def configure_gemini() -> None:
+    """Configures the genai clients from settings; this also drops any clients created before."""
+    genai.configure(api_key=settings.GOOGLE_API_KEY)
+
+
+def get_generative_model() -> genai.GenerativeModel:
+    global _generative_model
+    if _generative_model is None:
+        _generative_model = genai.GenerativeModel(settings.GEMINI_GENERATIVE_MODEL)
+    return _generative_model
+
+
+async def start_gemini_client() -> None:
+    """Configures Gemini and opens the async client inside the running event loop."""
+    global _async_client
+    if not settings.GOOGLE_API_KEY:
+        print("Warning: GOOGLE_API_KEY not found. All AI functionality will fail.")
+        return
+    configure_gemini()
+    _async_client = get_default_generative_async_client()
+    print("Gemini API client configured successfully.")
+
+
+async def close_gemini_client() -> None:
+    """Closes the async client's channel so no connections outlive the event loop."""
+    global _async_client, _generative_model
+    if _async_client is None:
+        return
+    await _async_client.transport.close()
+    _async_client = None
+    _generative_model = None
+    # Forget the closed client so a later lifespan (e.g. in tests) opens a fresh one
+    configure_gemini()
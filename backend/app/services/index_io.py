@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+# Shared by scripts/index_data.py, which writes the local index, and the vector store, which serves it.
+# faiss is imported lazily so the API starts without it when local search is disabled.
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq8", "binary")
+
+def create_index(index_type: str, dim: int, nlist: int, pq_m: int, hnsw_m: int):
+    """
+    Creates an empty FAISS index of the requested type. Embeddings are normalized, so every float
+    index uses inner product (cosine similarity), the same measure hybrid_search ranks by.
+    """
+    import faiss
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "sq8":
+        # One byte per dimension: 4x smaller than float32
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "binary":
+        # One bit per dimension (sign hashing), searched by Hamming distance: 32x smaller than float32
+        return faiss.IndexBinaryFlat(dim)
+    return faiss.IndexFlatIP(dim)
+
+def is_binary_index(path: str) -> bool:
+    """Binary FAISS indexes (fourcc "IB..") need read_index_binary instead of read_index."""
+    with open(path, "rb") as f:
+        return f.read(2) == b"IB"
+
+def read_index(path: str, mmap: bool = False):
+    import faiss
+    if is_binary_index(path):
+        return faiss.read_index_binary(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY) if mmap else faiss.read_index_binary(path)
+    if not mmap:
+        return faiss.read_index(path)
+    try:
+        # Maps flat, SQ and HNSW codes; IVF indexes reject IO_FLAG_MMAP_IFC and map their inverted lists instead
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+def set_search_params(index, nprobe: int, ef_search: int) -> None:
+    """
+    Applies the query-time accuracy knobs, which are not stored in the index file: the number of
+    inverted lists an IVF index scans and the candidate list size of an HNSW search.
+    """
+    import faiss
+    if isinstance(index, faiss.IndexBinary):
+        return
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+def write_index(index, path: str) -> None:
+    """Writes the index atomically, so readers never see a partial file."""
+    import faiss
+    tmp_path = f"{path}.tmp"
+    if isinstance(index, faiss.IndexBinary):
+        faiss.write_index_binary(index, tmp_path)
+    else:
+        faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Sign-hashes normalized vectors into the packed bit codes used by binary indexes (one bit per dimension)."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class VectorFile:
+    """
+    Full-precision float32 vectors stored back to back in a flat file, row i matching index row i.
+    Quantized indexes only approximate the vectors, so their top candidates are re-scored against this file.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+
+    def __len__(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (self.dim * 4)
+
+    def append(self, vectors: np.ndarray) -> None:
+        with open(self.path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+    def truncate(self, rows: int) -> None:
+        with open(self.path, "ab") as f:
+            f.truncate(rows * self.dim * 4)
+
+    def open(self) -> np.ndarray:
+        """Returns a read-only memory-mapped (rows, dim) view of the file."""
+        return np.memmap(self.path, dtype=np.float32, mode="r", shape=(len(self), self.dim))
@@ -0,0 +1,96 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional
+
+
+def _element_text(element: Optional[ET.Element]) -> str:
+    """Returns all text inside an element, including text nested in inline markup such as <i>."""
+    if element is None:
+        return ""
+    return "".join(element.itertext()).strip()
+
+def _publication_year(article: Optional[ET.Element]) -> Optional[int]:
+    """Reads the journal issue year, falling back to free-text MedlineDates such as "1998 Dec-1999 Jan"."""
+    if article is None:
+        return None
+    pub_date = article.find("Journal/JournalIssue/PubDate")
+    text = (pub_date.findtext("Year") or pub_date.findtext("MedlineDate") or "") if pub_date is not None else ""
+    if not text:
+        text = article.findtext("ArticleDate/Year", default="")
+    match = re.search(r"\d{4}", text)
+    return int(match.group()) if match else None
+
+def parse_pubmed_article(pubmed_article: ET.Element) -> Dict[str, Any]:
+    """Converts one <PubmedArticle> element into the article dict used across the app."""
+    citation = pubmed_article.find("MedlineCitation")
+    article = citation.find("Article") if citation is not None else None
+
+    pmid = citation.findtext("PMID", default="") if citation is not None else ""
+    title = _element_text(article.find("ArticleTitle")) if article is not None else ""
+
+    # Structured abstracts are split into labelled sections (BACKGROUND, METHODS, ...); keep them all
+    abstract_sections = []
+    if article is not None:
+        for section in article.iterfind("Abstract/AbstractText"):
+            text = _element_text(section)
+            if not text:
+                continue
+            label = section.get("Label")
+            abstract_sections.append(f"{label}: {text}" if label else text)
+
+    authors = []
+    if article is not None:
+        for author in article.iterfind("AuthorList/Author"):
+            fore_name, last_name = author.findtext("ForeName"), author.findtext("LastName")
+            if fore_name and last_name:
+                authors.append(f"{fore_name} {last_name}")
+
+    return {
+        "pmid": pmid,
+        "title": title or "No title available",
+        "abstract": " ".join(abstract_sections),
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+        "authors": ", ".join(authors) if authors else "No authors listed",
+        "year": _publication_year(article),
+    }
+
+
+class PubmedArticleParser:
+    """
+    An incremental parser for efetch XML.
+
+    Bytes are fed in as they arrive and each article dict is returned as soon as its
+    </PubmedArticle> closes. Finished elements are detached from the tree, so memory
+    stays bounded by the size of a single article rather than the whole response.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root: Optional[ET.Element] = None
+        self._depth = 0
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        """Feeds a chunk of the response and returns the articles it completed."""
+        self._parser.feed(data)
+        return self._read_events()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Signals the end of the response and returns any remaining articles."""
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self) -> List[Dict[str, Any]]:
+        articles = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = element
+                self._depth += 1
+                continue
+            self._depth -= 1
+            # Only direct children of <PubmedArticleSet> are complete records
+            if self._depth == 1:
+                if element.tag == "PubmedArticle":
+                    articles.append(parse_pubmed_article(element))
+                self._root.clear()
+        return articles
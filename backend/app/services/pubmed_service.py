@@ -1,86 +1,276 @@
 import httpx
 import asyncio
-import xml.etree.ElementTree as ET
+import importlib.util
+import time
 from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import List, Dict, Any, Tuple
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
+from ..core.cache import SingleFlight, SqliteCache, TTLCache, TieredCache
 from ..core.config import settings
+from ..core.metrics import record_stage, span, upstream_errors, upstream_retries
+from .pubmed_parser import PubmedArticleParser
+from .rate_limiter import AsyncTokenBucket
 
-client = httpx.AsyncClient()
+# Opened by the app lifespan (start_http_client) and shared by every request in the worker
+client: Optional[httpx.AsyncClient] = None
 
-@retry(wait=wait_exponential(multiplier=1, min=2, max=6), stop=stop_after_attempt(3))
-async def _make_api_request(url: str, params: Dict[str, Any]) -> httpx.Response:
+def create_http_client() -> httpx.AsyncClient:
+    http2 = settings.PUBMED_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("Warning: PUBMED_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1.")
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.PUBMED_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PUBMED_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.PUBMED_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(settings.PUBMED_HTTP_TIMEOUT_SECONDS, connect=settings.PUBMED_HTTP_CONNECT_TIMEOUT_SECONDS),
+    )
+
+def _get_client() -> httpx.AsyncClient:
+    # Scripts and benchmarks run without the app lifespan, so the client is also opened on first use
+    global client
+    if client is None:
+        client = create_http_client()
+    return client
+
+async def start_http_client() -> None:
+    _get_client()
+
+async def close_http_client() -> None:
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+
+def _build_cache(name: str, ttl: int, disk: Optional[SqliteCache]) -> Optional[TieredCache]:
+    if not settings.PUBMED_CACHE_ENABLED:
+        return None
+    return TieredCache(TTLCache(settings.PUBMED_CACHE_MAX_ENTRIES, ttl), disk, name=name)
+
+# esearch ID lists are keyed by normalized query, article records by PMID; both can share one SQLite file
+_disk_cache = SqliteCache(settings.PUBMED_CACHE_DB_PATH, settings.PUBMED_ARTICLE_CACHE_TTL_SECONDS) if settings.PUBMED_CACHE_ENABLED and settings.PUBMED_CACHE_DB_PATH else None
+search_cache = _build_cache("pubmed_search", settings.PUBMED_SEARCH_CACHE_TTL_SECONDS, _disk_cache)
+article_cache = _build_cache("pubmed_article", settings.PUBMED_ARTICLE_CACHE_TTL_SECONDS, _disk_cache)
+_search_flight = SingleFlight()
+_inflight_articles: Dict[str, asyncio.Future] = {}
+
+# One limiter for every PubMed request in the process, including retries
+rate_limiter = AsyncTokenBucket(settings.PUBMED_REQUESTS_PER_SECOND or (10 if settings.PUBMED_API_KEY else 3))
+
+def _count_retry(retry_state) -> None:
+    upstream_retries.inc("pubmed")
+
+def _count_error(error: httpx.HTTPError) -> None:
+    if isinstance(error, httpx.HTTPStatusError):
+        upstream_errors.inc("pubmed", f"http_{error.response.status_code}")
+    else:
+        upstream_errors.inc("pubmed", type(error).__name__)
+        print(f"Request error to PubMed API: {error}")
+
+@retry(wait=wait_exponential(multiplier=1, min=2, max=6), stop=stop_after_attempt(3), before_sleep=_count_retry)
+async def _request_with_retries(url: str, params: Dict[str, Any]) -> httpx.Response:
+    await rate_limiter.acquire()
     try:
-        response = await client.get(url, params=params, timeout=30.0)
+        response = await _get_client().get(url, params=params)
         response.raise_for_status()
         return response
-    except httpx.RequestError as e:
-        print(f"Request error to PubMed API: {e}")
+    except httpx.HTTPError as e:
+        _count_error(e)
         raise
 
+async def _make_api_request(url: str, params: Dict[str, Any]) -> httpx.Response:
+    # The span covers rate limiting and every retry, e.g. "pubmed_esearch"
+    endpoint = url.rsplit("/", 1)[-1].replace(".fcgi", "")
+    with span(f"pubmed_{endpoint}"):
+        return await _request_with_retries(url, params)
+
+def _normalize_query(query: str) -> str:
+    # Only whitespace is normalized: PubMed treats lowercase and/or/not as search terms, not operators
+    return " ".join(query.split())
+
+async def _esearch(query: str, count: int) -> Tuple[List[str], int]:
+    params = {
+        "db": "pubmed",
+        "term": query,
+        "retmax": count,
+        "usehistory": "y",
+        "api_key": settings.PUBMED_API_KEY,
+        "format": "json"
+    }
+    response = await _make_api_request(f"{settings.PUBMED_API_BASE_URL}/esearch.fcgi", params)
+    data = response.json()
+
+    esearch_result = data.get("esearchresult", {})
+    id_list = esearch_result.get("idlist", [])
+    total_count = int(esearch_result.get("count", "0"))
+    return id_list, total_count
+
+async def _cached_esearch(query: str, count: int) -> Tuple[List[str], int]:
+    cache_key = f"esearch:{count}:{query}"
+    cached = await search_cache.get(cache_key)
+    if cached is not None:
+        return cached[0], cached[1]
+    id_list, total_count = await _esearch(query, count)
+    await search_cache.set(cache_key, [id_list, total_count])
+    return id_list, total_count
+
 async def fetch_article_ids(query: str, count: int) -> Tuple[List[str], int]:
     """
     Fetches a list of PubMed article IDs and the total number of hits for the query.
+    Results are cached per normalized query, and identical concurrent searches share one upstream call.
     It now safely handles API errors by returning a default tuple.
     """
+    query = _normalize_query(query)
+    try:
+        if search_cache is None:
+            return await _esearch(query, count)
+        return await _search_flight.do((query, count), lambda: _cached_esearch(query, count))
+    except Exception as e:
+        print(f"Failed to fetch article IDs from PubMed: {e}")
+        # THIS IS THE FIX: Always return a two-item tuple to prevent unpacking errors
+        return [], 0
+
+async def search_with_history(query: str, count: int) -> Dict[str, Any]:
+    """
+    Runs esearch on the history server and returns the first `count` PMIDs, the total hit count and the
+    WebEnv/query_key of the result set, which later esummary/efetch calls can page through.
+    """
     params = {
         "db": "pubmed",
-        "term": query,
+        "term": _normalize_query(query),
         "retmax": count,
         "usehistory": "y",
         "api_key": settings.PUBMED_API_KEY,
         "format": "json"
     }
+    response = await _make_api_request(f"{settings.PUBMED_API_BASE_URL}/esearch.fcgi", params)
+    result = response.json().get("esearchresult", {})
+    return {
+        "ids": result.get("idlist", []),
+        "total_results": int(result.get("count", "0")),
+        "webenv": result.get("webenv", ""),
+        "query_key": result.get("querykey", ""),
+    }
+
+async def _esummary_batch(webenv: str, query_key: str, retstart: int, retmax: int) -> List[Dict[str, str]]:
+    params = {
+        "db": "pubmed",
+        "WebEnv": webenv,
+        "query_key": query_key,
+        "retstart": retstart,
+        "retmax": retmax,
+        "api_key": settings.PUBMED_API_KEY,
+        "format": "json"
+    }
+    response = await _make_api_request(f"{settings.PUBMED_API_BASE_URL}/esummary.fcgi", params)
+    result = response.json().get("result", {})
+    return [{"pmid": uid, "title": result.get(uid, {}).get("title", "")} for uid in result.get("uids", [])]
+
+async def fetch_history_summaries(webenv: str, query_key: str, count: int) -> List[Dict[str, str]]:
+    """
+    Returns the PMID and title of the first `count` records of a history result set, in esearch order.
+    esummary documents are far smaller than efetch records, so a large candidate pool can be ranked
+    before any full article is fetched.
+    """
+    batch_size = settings.PUBMED_ESUMMARY_BATCH_SIZE
+    batches = await asyncio.gather(*(
+        _esummary_batch(webenv, query_key, retstart, min(batch_size, count - retstart))
+        for retstart in range(0, count, batch_size)
+    ))
+    return [summary for batch in batches for summary in batch]
+
+async def stream_efetch_articles(params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """Streams an efetch response and yields each article as soon as it has been parsed."""
+    await rate_limiter.acquire()
+    async with _get_client().stream("GET", f"{settings.PUBMED_API_BASE_URL}/efetch.fcgi", params=params) as response:
+        response.raise_for_status()
+        parser = PubmedArticleParser()
+        parse_seconds = 0.0
+        async for chunk in response.aiter_bytes():
+            start = time.perf_counter()
+            articles = parser.feed(chunk)
+            parse_seconds += time.perf_counter() - start
+            for article in articles:
+                yield article
+        start = time.perf_counter()
+        articles = parser.close()
+        record_stage("xml_parse", parse_seconds + time.perf_counter() - start)
+        for article in articles:
+            yield article
+
+@retry(wait=wait_exponential(multiplier=1, min=2, max=6), stop=stop_after_attempt(3), before_sleep=_count_retry)
+async def _efetch_with_retries(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    try:
+        return [article async for article in stream_efetch_articles(params)]
+    except httpx.HTTPError as e:
+        _count_error(e)
+        raise
+
+async def efetch_articles(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Fetches one efetch page (by id list or history WebEnv) and returns its parsed articles."""
+    with span("pubmed_efetch"):
+        return await _efetch_with_retries(params)
+
+async def _fetch_details_batch(batch_pmids: List[str]) -> List[Dict[str, Any]]:
+    """Fetches and parses one efetch batch; a failed batch yields no articles."""
+    params = {
+        "db": "pubmed",
+        "id": ",".join(batch_pmids),
+        "retmode": "xml",
+        "api_key": settings.PUBMED_API_KEY
+    }
     try:
-        response = await _make_api_request(f"{settings.PUBMED_API_BASE_URL}/esearch.fcgi", params)
-        data = response.json()
-        
-        esearch_result = data.get("esearchresult", {})
-        id_list = esearch_result.get("idlist", [])
-        total_count = int(esearch_result.get("count", "0"))
-        
-        return id_list, total_count
+        return await efetch_articles(params)
     except Exception as e:
-        print(f"Failed to fetch article IDs from PubMed: {e}")
-        # THIS IS THE FIX: Always return a two-item tuple to prevent unpacking errors
-        return [], 0
+        print(f"Error fetching article details batch: {e}")
+        return []
+
+async def _fetch_uncached_details(pmids: List[str]) -> Dict[str, Dict[str, Any]]:
+    batch_size = settings.PUBMED_EFETCH_BATCH_SIZE
+    batches = await asyncio.gather(*(
+        _fetch_details_batch(pmids[i:i + batch_size]) for i in range(0, len(pmids), batch_size)
+    ))
+    return {article["pmid"]: article for batch in batches for article in batch}
 
 async def fetch_article_details(pmids: List[str]) -> List[Dict[str, Any]]:
-    """Fetches full article details for a given list of PubMed IDs."""
+    """
+    Fetches full article details for a given list of PubMed IDs.
+    Articles are cached by PMID, so different queries share entries, and a PMID already being fetched by
+    another request is awaited rather than fetched again. Remaining batches are dispatched concurrently
+    under the shared rate limiter and results are returned in PMID order.
+    """
     if not pmids:
         return []
-    articles = []
-    batch_size = 200
-    for i in range(0, len(pmids), batch_size):
-        batch_pmids = pmids[i:i + batch_size]
-        pmid_string = ",".join(batch_pmids)
-        params = {
-            "db": "pubmed",
-            "id": pmid_string,
-            "retmode": "xml",
-            "api_key": settings.PUBMED_API_KEY
-        }
+    if article_cache is None:
+        articles_by_pmid = await _fetch_uncached_details(list(dict.fromkeys(pmids)))
+        return [articles_by_pmid[pmid] for pmid in pmids if pmid in articles_by_pmid]
+
+    cached = await article_cache.get_many(f"article:{pmid}" for pmid in dict.fromkeys(pmids))
+    articles_by_pmid = {key.split(":", 1)[1]: article for key, article in cached.items()}
+    waiting = {pmid: _inflight_articles[pmid] for pmid in pmids if pmid not in articles_by_pmid and pmid in _inflight_articles}
+    to_fetch = [pmid for pmid in dict.fromkeys(pmids) if pmid not in articles_by_pmid and pmid not in waiting]
+
+    if to_fetch:
+        loop = asyncio.get_running_loop()
+        futures = {pmid: loop.create_future() for pmid in to_fetch}
+        _inflight_articles.update(futures)
+        fetched = {}
         try:
-            response = await _make_api_request(f"{settings.PUBMED_API_BASE_URL}/efetch.fcgi", params)
-            root = ET.fromstring(response.text)
-            for pubmed_article in root.findall(".//PubmedArticle"):
-                article_data = {}
-                pmid_element = pubmed_article.find(".//PMID")
-                article_data["pmid"] = pmid_element.text if pmid_element is not None else ""
-                title_element = pubmed_article.find(".//ArticleTitle")
-                article_data["title"] = title_element.text if title_element is not None else "No title available"
-                abstract_element = pubmed_article.find(".//AbstractText")
-                article_data["abstract"] = abstract_element.text if abstract_element is not None else ""
-                article_data["url"] = f"https://pubmed.ncbi.nlm.nih.gov/{article_data['pmid']}/"
-                
-                authors = [
-                    f"{author.find('ForeName').text} {author.find('LastName').text}"
-                    for author in pubmed_article.findall(".//Author")
-                    if author.find("LastName") is not None and author.find("ForeName") is not None
-                ]
-                article_data["authors"] = ", ".join(authors) if authors else "No authors listed"
-                articles.append(article_data)
-        except Exception as e:
-            print(f"Error fetching article details batch: {e}")
-        await asyncio.sleep(0.3) # Politeness delay to not overwhelm the API
-    return articles
+            fetched = await _fetch_uncached_details(to_fetch)
+            await article_cache.set_many({f"article:{pmid}": article for pmid, article in fetched.items()})
+        finally:
+            # Resolve every future, so concurrent requests never wait on a failed or cancelled fetch
+            for pmid, future in futures.items():
+                _inflight_articles.pop(pmid, None)
+                future.set_result(fetched.get(pmid))
+        articles_by_pmid.update(fetched)
+
+    for pmid, future in waiting.items():
+        article = await future
+        if article is not None:
+            articles_by_pmid[pmid] = article
+    return [articles_by_pmid[pmid] for pmid in pmids if pmid in articles_by_pmid]
@@ -0,0 +1,27 @@
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """
+    A token-bucket rate limiter shared by every coroutine in the process.
+
+    Each call to acquire() takes one token; when the bucket is empty the caller
+    reserves the next token and sleeps until it is due, so waiters are released
+    in arrival order at no more than `rate` per second.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        # No await happens between reading and updating the bucket, so no lock is needed
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
@@ -1,19 +1,48 @@
+import asyncio
+import hashlib
 import numpy as np
 import google.generativeai as genai
 import json
+import random
 import re
-from typing import List, Dict, Any, Optional
+import secrets
+import time
+from typing import AsyncIterator, Awaitable, List, Dict, Any, Optional, Tuple
 
 from . import pubmed_service
+from .bm25 import bm25_scores
+from .embedding_service import embed_texts, local_embedder
+from .entity_matcher import get_entity_matcher, split_sentences
+from .gemini_client import REQUEST_OPTIONS, get_generative_model
+from .vector_store import vector_store
+from ..core.cache import SemanticCache, SqliteCache, TTLCache, TieredCache
 from ..core.config import settings
-from ..models.search import AdvancedSearchClause
+from ..core.metrics import prerank_recall, span, upstream_errors
+from ..models.search import AdvancedSearchClause, BatchSearchQuery
 
-# API Configuration
-if settings.GOOGLE_API_KEY:
-    genai.configure(api_key=settings.GOOGLE_API_KEY)
-    print("Gemini API client configured successfully.")
-else:
-    print("Warning: GOOGLE_API_KEY not found. All AI functionality will fail.")
+# Query suggestions per normalized query; None is cached too, meaning "no better query"
+suggestion_cache = TTLCache(settings.SUGGESTION_CACHE_MAX_ENTRIES, settings.SUGGESTION_CACHE_TTL_SECONDS, name="suggestion")
+_NOT_CACHED = object()
+_background_tasks: set = set()
+
+# Re-ranked results of recent plain queries, found by query embedding similarity
+semantic_cache = SemanticCache(
+    settings.SEMANTIC_CACHE_MAX_ENTRIES, settings.SEMANTIC_CACHE_TTL_SECONDS, settings.SEMANTIC_CACHE_THRESHOLD, name="semantic_query"
+)
+
+# Ranked candidate pools of paginated searches, keyed by the pool id embedded in their cursors
+# The SQLite tier lets any worker continue a cursor issued by another one
+cursor_cache = TieredCache(
+    TTLCache(settings.SEARCH_CURSOR_MAX_ENTRIES, settings.SEARCH_CURSOR_TTL_SECONDS),
+    SqliteCache(settings.SEARCH_CURSOR_DB_PATH, settings.SEARCH_CURSOR_TTL_SECONDS) if settings.SEARCH_CURSOR_DB_PATH else None,
+    name="search_cursor",
+)
+_CURSOR_PURGE_INTERVAL_SECONDS = 60
+_last_cursor_purge = 0.0
+_MAX_HISTORY_RECORDS = 9999  # E-utilities only page through the first 9999 hits of a search
+
+# Per-article knowledge graphs keyed by a hash of the generative model and article text
+graph_cache = TTLCache(settings.GRAPH_CACHE_MAX_ENTRIES, settings.GRAPH_CACHE_TTL_SECONDS, name="knowledge_graph")
 
 # --- Helper and Transformation Functions ---
 def build_advanced_pubmed_query(clauses: List[AdvancedSearchClause]) -> str:
@@ -35,65 +64,466 @@ def build_advanced_pubmed_query(clauses: List[AdvancedSearchClause]) -> str:
         full_query += f" {clauses[i-1].operator} {query_parts[i]}"
     return full_query
 
-def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    # This function is unchanged
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+def _rank_by_similarity(query_embedding: np.ndarray, document_embeddings: np.ndarray, top_k: Optional[int] = None) -> Tuple[np.ndarray, List[float]]:
+    """
+    Scores every document by cosine similarity with one matrix-vector product.
+    Returns the row indices of the best top_k documents (all if None), best first, and their scores as native floats.
+    Float32 matrices (e.g. from the embedding cache) are used as-is without copying.
+    """
+    documents = np.asarray(document_embeddings, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    document_norms = np.sqrt(np.einsum("ij,ij->i", documents, documents))
+    scores = documents @ query
+    scores /= np.maximum(document_norms, 1e-12)
+
+    if top_k is not None and top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order, scores[order].tolist()
+
+# --- Two-Stage Re-ranking ---
+async def _prerank(query: str, texts: List[str]) -> List[int]:
+    """Orders all texts with the cheap local first stage (BM25 or the local SentenceTransformer), best first."""
+    if settings.PRERANK_METHOD == "local":
+        query_embeddings, text_embeddings = await asyncio.gather(
+            embed_texts([query], "retrieval_query", local_embedder),
+            embed_texts(texts, "retrieval_document", local_embedder),
+        )
+        order, _ = _rank_by_similarity(query_embeddings[0], text_embeddings)
+        return order.tolist()
+    scores = await asyncio.to_thread(bm25_scores, query, texts)
+    return np.argsort(-scores, kind="stable").tolist()
+
+async def _measure_prerank_recall(query: str, texts: List[str], shortlist: List[int]) -> None:
+    """Embeds every candidate to see how many of the full ranking's top K the pre-ranker kept."""
+    try:
+        query_embeddings, text_embeddings = await asyncio.gather(
+            embed_texts([query], "retrieval_query"),
+            embed_texts(texts, "retrieval_document"),
+        )
+        top_k = min(settings.PRERANK_RECALL_K, len(texts))
+        order, _ = _rank_by_similarity(query_embeddings[0], text_embeddings, top_k=top_k)
+        recall = len(set(order.tolist()) & set(shortlist)) / top_k
+        prerank_recall.observe(recall, settings.PRERANK_METHOD)
+        print(f"[PRERANK] {settings.PRERANK_METHOD} recall@{top_k} with top {len(shortlist)} of {len(texts)}: {recall:.2f}")
+    except Exception as e:
+        print(f"Warning: pre-rank recall measurement failed: {e}")
+
+async def _embed_query(query: str) -> np.ndarray:
+    return (await embed_texts([query], "retrieval_query"))[0]
+
+async def _semantic_rank(
+    query: str, texts: List[str], prerank_texts: Optional[List[str]] = None, query_embedding: Optional[Awaitable[np.ndarray]] = None
+) -> Tuple[List[int], List[Optional[float]]]:
+    """
+    Orders texts by embedding similarity to the query, returning indices and scores, best first.
+    With PRERANK_METHOD set, the pre-ranker scores prerank_texts (default: texts) and only its top
+    PRERANK_TOP_N are embedded by the document embedder; the rest follow in pre-rank order with a score of None.
+    query_embedding can be a task, started earlier, that embeds the query with the document embedder.
+    """
+    shortlist, rest = list(range(len(texts))), []
+    if settings.PRERANK_METHOD and len(texts) > settings.PRERANK_TOP_N:
+        with span("prerank"):
+            preranked = await _prerank(query, prerank_texts or texts)
+        shortlist, rest = preranked[:settings.PRERANK_TOP_N], preranked[settings.PRERANK_TOP_N:]
+        if random.random() < settings.PRERANK_RECALL_SAMPLE_RATE:
+            # Measured off the request path; the shortlist embeddings come from the cache
+            task = asyncio.create_task(_measure_prerank_recall(query, texts, shortlist))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+    with span("embedding"):
+        query_embedding, document_embeddings = await asyncio.gather(
+            query_embedding if query_embedding is not None else _embed_query(query),
+            embed_texts([texts[i] for i in shortlist], "retrieval_document"),
+        )
+    with span("ranking"):
+        order, scores = _rank_by_similarity(query_embedding, document_embeddings)
+    return [shortlist[i] for i in order] + rest, scores + [None] * len(rest)
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
 async def _get_query_suggestion_with_gemini(user_query: str) -> Optional[str]:
-    # This function is unchanged
+    """Asks Gemini for a corrected query; results (including "no suggestion") are cached per normalized query."""
+    cache_key = _normalize_query(user_query)
+    cached = suggestion_cache.get(cache_key, _NOT_CACHED)
+    if cached is not _NOT_CACHED:
+        return cached
     try:
-        model = genai.GenerativeModel(settings.GEMINI_GENERATIVE_MODEL)
+        model = get_generative_model()
         prompt = f"""You are a highly intelligent search query corrector for PubMed. Correct spelling or replace jargon. Return only the corrected query. If it's already correct, return the original.
 User Query: "{user_query}"
 Corrected Query:"""
-        response = await model.generate_content_async(prompt)
+        with span("gemini_suggestion"):
+            response = await model.generate_content_async(prompt, request_options=REQUEST_OPTIONS)
         suggestion = response.text.strip()
-        if suggestion.lower() != user_query.lower() and suggestion:
-            return suggestion
-        return None
+        result = suggestion if suggestion and suggestion.lower() != user_query.lower() else None
+        suggestion_cache.set(cache_key, result)
+        return result
     except Exception as e:
+        # Failures are not cached so the next request can try again
+        upstream_errors.inc("gemini", type(e).__name__)
         print(f"Warning: Gemini suggestion generation failed: {e}")
         return None
 
-# --- Main Search Logic (Unchanged) ---
-async def hybrid_search(original_query: str, keyword_query: Optional[str], top_k: int, check_suggestion: bool = False) -> Dict[str, Any]:
-    # This function is unchanged
-    suggestion = await _get_query_suggestion_with_gemini(original_query) if check_suggestion else None
-    final_keyword_query = keyword_query if keyword_query else (suggestion or original_query)
-    article_ids, total_results = await pubmed_service.fetch_article_ids(final_keyword_query, count=top_k)
+def _start_suggestion(user_query: str) -> asyncio.Task:
+    """Starts the suggestion call in the background; the task is kept alive even if the search stops waiting for it."""
+    task = asyncio.create_task(_get_query_suggestion_with_gemini(user_query))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def _suggestion_if_ready(task: Optional[asyncio.Task]) -> Optional[str]:
+    return task.result() if task is not None and task.done() else None
+
+# --- Main Search Logic ---
+async def _hybrid_search(
+    original_query: str, keyword_query: Optional[str], top_k: int, check_suggestion: bool, query_embedding: Optional[Awaitable[np.ndarray]] = None
+) -> Dict[str, Any]:
+    """
+    Retrieves PubMed keyword hits and re-ranks them semantically.
+    When check_suggestion is set, the suggestion call runs speculatively alongside esearch: its query is only
+    searched if the original returns fewer than SUGGESTION_MIN_HITS hits, and it is otherwise reported if ready.
+    """
+    suggestion_task = _start_suggestion(original_query) if check_suggestion else None
+    final_keyword_query = keyword_query if keyword_query else original_query
+    with span("keyword_search"):
+        article_ids, total_results = await pubmed_service.fetch_article_ids(final_keyword_query, count=top_k)
+    if suggestion_task is not None and total_results < settings.SUGGESTION_MIN_HITS:
+        with span("suggestion_wait"):
+            suggestion = await suggestion_task
+        if suggestion and not keyword_query:
+            with span("keyword_search"):
+                suggested_ids, suggested_total = await pubmed_service.fetch_article_ids(suggestion, count=top_k)
+            if suggested_total > total_results:
+                article_ids, total_results = suggested_ids, suggested_total
     if not article_ids:
-        return {"results": [], "suggestion": suggestion, "total_results": 0}
-    articles = await pubmed_service.fetch_article_details(article_ids)
+        return {"results": [], "suggestion": _suggestion_if_ready(suggestion_task), "total_results": 0}
+    with span("fetch_details"):
+        articles = await pubmed_service.fetch_article_details(article_ids)
     articles_with_abstracts = [a for a in articles if a.get("abstract")]
     if not articles_with_abstracts:
-        return {"results": articles, "suggestion": suggestion, "total_results": total_results}
+        return {"results": articles, "suggestion": _suggestion_if_ready(suggestion_task), "total_results": total_results}
     try:
-        query_embedding = np.array(genai.embed_content(model=settings.GEMINI_EMBEDDING_MODEL, content=original_query, task_type="retrieval_query")['embedding'])
-        article_embeddings = np.array(genai.embed_content(model=settings.GEMINI_EMBEDDING_MODEL, content=[a['abstract'] for a in articles_with_abstracts], task_type="retrieval_document")['embedding'])
-        for i, article in enumerate(articles_with_abstracts):
-            article['score'] = _cosine_similarity(query_embedding, article_embeddings[i])
-        reranked_articles = sorted(articles_with_abstracts, key=lambda x: x.get('score', 0), reverse=True)
-        reranked_pmids = {a['pmid'] for a in reranked_articles}
-        other_articles = [a for a in articles if a['pmid'] not in reranked_pmids]
-        return {"results": reranked_articles + other_articles, "suggestion": suggestion, "total_results": total_results}
+        order, scores = await _semantic_rank(
+            original_query,
+            [a['abstract'] for a in articles_with_abstracts],
+            prerank_texts=[f"{a.get('title', '')} {a['abstract']}" for a in articles_with_abstracts],
+            query_embedding=query_embedding,
+        )
+        reranked_articles = [{**articles_with_abstracts[i], 'score': score} for i, score in zip(order, scores)]
+        other_articles = [a for a in articles if not a.get("abstract")]
+        return {"results": reranked_articles + other_articles, "suggestion": _suggestion_if_ready(suggestion_task), "total_results": total_results}
     except Exception as e:
         print(f"Error during semantic re-ranking: {e}. Returning keyword results.")
-        return {"results": articles, "suggestion": suggestion, "total_results": total_results}
+        return {"results": articles, "suggestion": _suggestion_if_ready(suggestion_task), "total_results": total_results}
+
+async def hybrid_search(original_query: str, keyword_query: Optional[str], top_k: int, check_suggestion: bool = False) -> Dict[str, Any]:
+    """
+    Re-ranked PubMed search (see _hybrid_search) behind the optional semantic query cache. The query is
+    embedded while esearch runs; if a recent query with the same top_k and suggestion flag is within
+    SEMANTIC_CACHE_THRESHOLD, its re-ranked PMIDs are reused and the speculative search is cancelled.
+    Advanced (keyword) queries bypass the cache.
+    """
+    if not settings.SEMANTIC_CACHE_ENABLED or keyword_query:
+        return await _hybrid_search(original_query, keyword_query, top_k, check_suggestion)
+
+    embedding_task = asyncio.create_task(_embed_query(original_query))
+    search_task = asyncio.create_task(_hybrid_search(original_query, keyword_query, top_k, check_suggestion, embedding_task))
+    try:
+        with span("query_embedding"):
+            query_embedding = await embedding_task
+    except asyncio.CancelledError:
+        search_task.cancel()
+        raise
+    except Exception as e:
+        print(f"Warning: query embedding failed, skipping the semantic cache: {e}")
+        return await search_task
+
+    namespace = (top_k, check_suggestion)
+    cached, similarity = semantic_cache.lookup(query_embedding, namespace)
+    if cached is not None:
+        search_task.cancel()
+        print(f"[SEMANTIC CACHE] Reusing results of \"{cached['query']}\" (similarity {similarity:.3f}).")
+        with span("fetch_details"):
+            articles = await pubmed_service.fetch_article_details(cached["pmids"])
+        scores = dict(zip(cached["pmids"], cached["scores"]))
+        results = [{**article, "score": scores.get(article["pmid"])} for article in articles]
+        return {"results": results, "suggestion": cached["suggestion"], "total_results": cached["total_results"]}
+
+    search_data = await search_task
+    # Only re-ranked answers are worth reusing; keyword-order fallbacks are retried next time
+    if any(article.get("score") is not None for article in search_data["results"]):
+        semantic_cache.set(query_embedding, {
+            "query": original_query,
+            "pmids": [article["pmid"] for article in search_data["results"]],
+            "scores": [article.get("score") for article in search_data["results"]],
+            "suggestion": search_data["suggestion"],
+            "total_results": search_data["total_results"],
+        }, namespace)
+    return search_data
+
+# --- Paginated Search ---
+async def _rank_candidate_pool(original_query: str, keyword_query: Optional[str], pool_size: int, check_suggestion: bool) -> Dict[str, Any]:
+    """
+    Retrieves up to pool_size PubMed hits and ranks them by title similarity using esummary, without
+    fetching any full article. Only the ranked PMIDs, their scores and the esearch history handle are kept.
+    """
+    suggestion_task = _start_suggestion(original_query) if check_suggestion else None
+    final_keyword_query = keyword_query if keyword_query else original_query
+    empty = {"ids": [], "total_results": 0, "webenv": "", "query_key": ""}
+    try:
+        with span("keyword_search"):
+            history = await pubmed_service.search_with_history(final_keyword_query, pool_size)
+        if suggestion_task is not None and history["total_results"] < settings.SUGGESTION_MIN_HITS:
+            with span("suggestion_wait"):
+                suggestion = await suggestion_task
+            if suggestion and not keyword_query:
+                with span("keyword_search"):
+                    suggested = await pubmed_service.search_with_history(suggestion, pool_size)
+                if suggested["total_results"] > history["total_results"]:
+                    history = suggested
+    except Exception as e:
+        print(f"Failed to fetch article IDs from PubMed: {e}")
+        history = empty
+
+    pmids: List[str] = history["ids"]
+    scores: List[Optional[float]] = [None] * len(pmids)
+    if pmids:
+        try:
+            with span("fetch_summaries"):
+                summaries = await pubmed_service.fetch_history_summaries(history["webenv"], history["query_key"], len(pmids))
+            titled = [summary for summary in summaries if summary["title"]]
+            order, ranked_scores = await _semantic_rank(original_query, [summary["title"] for summary in titled])
+            ranked = [titled[i]["pmid"] for i in order]
+            ranked_set = set(ranked)
+            pmids = ranked + [pmid for pmid in pmids if pmid not in ranked_set]
+            scores = ranked_scores + [None] * (len(pmids) - len(ranked))
+        except Exception as e:
+            print(f"Error during candidate ranking: {e}. Keeping PubMed order.")
+
+    return {
+        "pmids": pmids,
+        "scores": scores,
+        "webenv": history["webenv"],
+        "query_key": history["query_key"],
+        "total_results": history["total_results"],
+        "suggestion": _suggestion_if_ready(suggestion_task),
+    }
+
+async def _decode_cursor(cursor: str) -> Tuple[str, Dict[str, Any], int, Optional[int]]:
+    """Returns the pool id, pool, offset and page size of a `<pool id>.<offset>[.<page size>]` cursor."""
+    pool_id, _, position = cursor.partition(".")
+    offset, _, page_size = position.partition(".")
+    pool = await cursor_cache.get(pool_id)
+    if pool is None or not offset.isdigit() or page_size and not page_size.isdigit():
+        raise ValueError("The cursor is invalid or has expired; start the search again.")
+    return pool_id, pool, int(offset), int(page_size) if page_size else None
+
+async def _hydrate_page(pool: Dict[str, Any], start: int, end: int) -> List[Dict[str, Any]]:
+    """Fetches full records for one page: ranked PMIDs by id, and hits past the ranked pool from the esearch history."""
+    results = []
+    page_pmids = pool["pmids"][start:end]
+    if page_pmids:
+        scores = dict(zip(page_pmids, pool["scores"][start:end]))
+        with span("fetch_details"):
+            articles = await pubmed_service.fetch_article_details(page_pmids)
+        results = [{**article, "score": scores.get(article["pmid"])} for article in articles]
+
+    # Beyond the ranked pool, pages continue in PubMed's own order
+    tail_start = max(start, len(pool["pmids"]))
+    if end > tail_start and pool["webenv"]:
+        params = {
+            "db": "pubmed",
+            "WebEnv": pool["webenv"],
+            "query_key": pool["query_key"],
+            "retstart": tail_start,
+            "retmax": end - tail_start,
+            "retmode": "xml",
+            "api_key": settings.PUBMED_API_KEY
+        }
+        try:
+            results += await pubmed_service.efetch_articles(params)
+        except Exception as e:
+            print(f"Error fetching page from search history: {e}")
+    return results
+
+async def paginated_search(original_query: str, keyword_query: Optional[str], page_size: Optional[int], cursor: Optional[str] = None, check_suggestion: bool = False) -> Dict[str, Any]:
+    """
+    Returns one page of semantically ranked results and a cursor for the next page.
+
+    The first call ranks a candidate pool of SEARCH_CANDIDATE_POOL_SIZE hits and stores the ranking
+    together with the esearch WebEnv/query_key; each page then fetches details for its own PMIDs only.
+    When a cursor is given the query arguments are ignored and the stored ranking is continued, with
+    the page size the cursor carries unless page_size is given (default: SEARCH_PAGE_SIZE).
+    """
+    global _last_cursor_purge
+    if cursor:
+        pool_id, pool, start, cursor_page_size = await _decode_cursor(cursor)
+        page_size = page_size or cursor_page_size
+    else:
+        pool = await _rank_candidate_pool(original_query, keyword_query, settings.SEARCH_CANDIDATE_POOL_SIZE, check_suggestion)
+        pool_id, start = secrets.token_urlsafe(12), 0
+        await cursor_cache.set(pool_id, pool)
+        if cursor_cache.disk is not None and time.monotonic() - _last_cursor_purge > _CURSOR_PURGE_INTERVAL_SECONDS:
+            _last_cursor_purge = time.monotonic()
+            await asyncio.to_thread(cursor_cache.disk.purge_expired)
+
+    page_size = page_size or settings.SEARCH_PAGE_SIZE
+    end = start + page_size
+    results = await _hydrate_page(pool, start, end)
+    available = max(len(pool["pmids"]), min(pool["total_results"], _MAX_HISTORY_RECORDS) if pool["webenv"] else 0)
+    return {
+        "results": results,
+        "suggestion": pool["suggestion"],
+        "total_results": pool["total_results"],
+        "next_cursor": f"{pool_id}.{end}.{page_size}" if end < available else None,
+    }
+
+# --- Batch Search ---
+def _batch_query_terms(item: BatchSearchQuery) -> Tuple[str, str]:
+    """Returns the keyword query and the semantic intent of one batch item."""
+    if item.clauses:
+        return build_advanced_pubmed_query(item.clauses), " ".join(c.value for c in item.clauses)
+    if item.query and item.query.strip():
+        return item.query, item.query
+    raise ValueError("Each batch query needs a non-empty query or clauses.")
+
+async def _fetch_batch_details(pmids: List[str], articles_by_pmid: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Adds the details of `pmids` to articles_by_pmid and returns the PMIDs that were not returned."""
+    try:
+        articles_by_pmid.update((a["pmid"], a) for a in await pubmed_service.fetch_article_details(pmids))
+    except Exception as e:
+        print(f"Error fetching batch article details: {e}")
+    return [pmid for pmid in pmids if pmid not in articles_by_pmid]
+
+async def stream_batch_search(items: List[BatchSearchQuery], top_k: int) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs many searches and yields one result dict per query, in request order.
+
+    Queries are processed in chunks of BATCH_SEARCH_CHUNK_SIZE. A chunk's esearches run concurrently,
+    PMIDs already seen anywhere in the batch are not fetched or embedded again, and the chunk's new
+    abstracts and all of its queries are embedded in shared batches. A query whose search or article
+    fetch fails gets an error line, and the rest of the batch carries on.
+    """
+    articles_by_pmid: Dict[str, Dict[str, Any]] = {}
+    vectors_by_pmid: Dict[str, np.ndarray] = {}
+    chunk_size = settings.BATCH_SEARCH_CHUNK_SIZE
+
+    for chunk_start in range(0, len(items), chunk_size):
+        lines: Dict[int, Dict[str, Any]] = {}
+        prepared = []
+        for index, item in enumerate(items[chunk_start:chunk_start + chunk_size], start=chunk_start):
+            try:
+                prepared.append((index, item, *_batch_query_terms(item)))
+            except ValueError as ve:
+                lines[index] = {"index": index, "id": item.id, "error": str(ve)}
+
+        with span("keyword_search"):
+            searches = await asyncio.gather(
+                *(pubmed_service.fetch_article_ids(keyword, count=top_k) for _, _, keyword, _ in prepared), return_exceptions=True
+            )
+        failed = {index: str(e) for (index, _, _, _), e in zip(prepared, searches) if isinstance(e, Exception)}
+        new_pmids = list(dict.fromkeys(
+            pmid for (index, _, _, _), search in zip(prepared, searches) if index not in failed
+            for pmid in search[0] if pmid not in articles_by_pmid
+        ))
+        if new_pmids:
+            with span("fetch_details"):
+                missing = await _fetch_batch_details(new_pmids, articles_by_pmid)
+                if missing:
+                    # Failed efetch batches are logged and dropped upstream, so their PMIDs get one more try
+                    print(f"[BATCH SEARCH] {len(missing)} article records were not returned; retrying them.")
+                    missing = await _fetch_batch_details(missing, articles_by_pmid)
+            missing_set = set(missing)
+            for (index, _, _, _), search in zip(prepared, searches):
+                lost = sum(pmid in missing_set for pmid in search[0]) if index not in failed else 0
+                if lost:
+                    failed[index] = f"Could not fetch {lost} of {len(search[0])} articles from PubMed; try the query again."
+
+        query_vectors = None
+        to_embed = [pmid for pmid in new_pmids if articles_by_pmid.get(pmid, {}).get("abstract")]
+        try:
+            with span("embedding"):
+                query_vectors, document_vectors = await asyncio.gather(
+                    embed_texts([intent for _, _, _, intent in prepared], "retrieval_query"),
+                    embed_texts([articles_by_pmid[pmid]["abstract"] for pmid in to_embed], "retrieval_document"),
+                )
+            vectors_by_pmid.update(zip(to_embed, document_vectors))
+        except Exception as e:
+            print(f"Error during batch embedding: {e}. Returning keyword results.")
+
+        for row, ((index, item, keyword, _), search) in enumerate(zip(prepared, searches)):
+            if index in failed:
+                lines[index] = {"index": index, "id": item.id, "query": keyword, "error": failed[index]}
+                continue
+            ids, total_results = search
+            articles = [articles_by_pmid[pmid] for pmid in ids if pmid in articles_by_pmid]
+            embedded = [a for a in articles if a["pmid"] in vectors_by_pmid] if query_vectors is not None else []
+            results = articles
+            if embedded:
+                with span("ranking"):
+                    order, scores = _rank_by_similarity(query_vectors[row], np.vstack([vectors_by_pmid[a["pmid"]] for a in embedded]))
+                results = [{**embedded[i], "score": score} for i, score in zip(order, scores)]
+                results += [a for a in articles if a["pmid"] not in vectors_by_pmid]
+            lines[index] = {"index": index, "id": item.id, "query": keyword, "results": results, "total_results": total_results}
+
+        for index in sorted(lines):
+            yield lines[index]
+
+# --- Local Index Retrieval ---
+def _reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+    """Merges ranked result lists by summing 1 / (k + rank) per PMID; the fused score replaces 'score'."""
+    fused_scores: Dict[str, float] = {}
+    articles: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, article in enumerate(results, start=1):
+            pmid = article["pmid"]
+            fused_scores[pmid] = fused_scores.get(pmid, 0.0) + 1.0 / (k + rank)
+            articles.setdefault(pmid, article)
+    ranked_pmids = sorted(fused_scores, key=fused_scores.get, reverse=True)
+    return [{**articles[pmid], "score": fused_scores[pmid]} for pmid in ranked_pmids]
+
+async def local_search(query: str, top_k: int) -> Dict[str, Any]:
+    """Answers a query entirely from the local FAISS index, without calling PubMed."""
+    with span("local_search"):
+        results = await vector_store.search(query, top_k)
+    return {"results": results, "suggestion": None, "total_results": len(results)}
+
+async def fused_search(original_query: str, keyword_query: Optional[str], top_k: int, check_suggestion: bool = False) -> Dict[str, Any]:
+    """Runs local and PubMed hybrid search concurrently and fuses them with reciprocal rank fusion."""
+    local_data, pubmed_data = await asyncio.gather(
+        local_search(original_query, top_k),
+        hybrid_search(original_query, keyword_query, top_k, check_suggestion),
+    )
+    fused_results = _reciprocal_rank_fusion([local_data["results"], pubmed_data["results"]], settings.RRF_K)
+    return {
+        "results": fused_results[:top_k],
+        "suggestion": pubmed_data["suggestion"],
+        "total_results": max(pubmed_data["total_results"], len(fused_results)),
+    }
 
 # --- FINAL, ULTRA-ROBUST KNOWLEDGE GRAPH IMPLEMENTATION ---
 
 async def _call_gemini_for_graph(prompt: str) -> Optional[Dict[str, Any]]:
     """Helper to call Gemini API and handle potential errors."""
     try:
-        model = genai.GenerativeModel(settings.GEMINI_GENERATIVE_MODEL)
-        response = await model.generate_content_async(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type="application/json"
+        model = get_generative_model()
+        with span("gemini_graph"):
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    response_mime_type="application/json"
+                ),
+                request_options=REQUEST_OPTIONS,
             )
-        )
         return json.loads(response.text)
     except (Exception, json.JSONDecodeError) as e:
+        upstream_errors.inc("gemini", type(e).__name__)
         print(f"[GRAPH] Gemini API call or JSON parsing failed: {e}")
         return None
 
@@ -115,17 +545,16 @@ def _get_first_source(sources: Dict) -> tuple[str, str]:
     first_pmid = next(iter(sources))
     return first_pmid, sources[first_pmid]['url']
 
-async def generate_knowledge_graph(context_text: str) -> Dict[str, Any]:
-    print("\n--- [GRAPH] FINAL ATTEMPT: Generating Knowledge Graph ---")
-
-    if not settings.GOOGLE_API_KEY:
-        print("[GRAPH] FATAL: Gemini client not configured.")
-        return {"nodes": [], "links": []}
+def _split_context_by_article(context_text: str) -> List[str]:
+    """Splits the combined context into one chunk per `From article pmid:` marker."""
+    chunks = [chunk.strip() for chunk in re.split(r'(?m)^(?=From article pmid:)', context_text)]
+    return [chunk for chunk in chunks if chunk]
 
+async def _extract_graph_from_text(context_text: str) -> Optional[Dict[str, Any]]:
+    """Runs the two-attempt extraction on one piece of text; returns None if no nodes could be extracted."""
     source_map = _extract_sources_from_context(context_text)
     
     # Attempt 1: Chain of Thought prompt
-    print("[GRAPH] Attempt 1: Using Chain-of-Thought prompt.")
     chain_of_thought_prompt = f"""
 Analyze the provided biomedical text step-by-step.
 First, identify all key entities (like Diseases, Genes, Drugs, Proteins). For each entity, note the `pmid` from the source text.
@@ -162,8 +591,7 @@ Text to analyze:
 
     # Final Validation and Augmentation
     if not graph_data or "nodes" not in graph_data:
-        print("[GRAPH] FAIL: All attempts failed to produce any nodes.")
-        return {"nodes": [], "links": []}
+        return None
 
     fallback_pmid, fallback_url = _get_first_source(source_map)
     for node in graph_data.get("nodes", []):
@@ -175,11 +603,232 @@ Text to analyze:
     node_ids = {node['id'] for node in validated_nodes}
     validated_links = [link for link in graph_data.get('links', []) if link.get('source') in node_ids and link.get('target') in node_ids]
     
-    final_graph_data = {"nodes": validated_nodes, "links": validated_links}
+    return {"nodes": validated_nodes, "links": validated_links}
+
+async def _extract_article_graph(article_text: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    """Extracts the graph for one article, memoized by a hash of the model and article text."""
+    cache_key = hashlib.sha256(f"{settings.GEMINI_GENERATIVE_MODEL}|{article_text}".encode("utf-8")).hexdigest()
+    cached = graph_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    async with semaphore:
+        graph_data = await _extract_graph_from_text(article_text)
+    if graph_data is None:
+        # Failures are not cached so the next request can try again
+        return {"nodes": [], "links": []}
+    graph_cache.set(cache_key, graph_data)
+    return graph_data
+
+class _GraphMerger:
+    """Accumulates per-article graphs, keeping the first node seen for each id and dropping duplicate links."""
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.links: Dict[tuple, Dict[str, Any]] = {}
+
+    def add(self, graph_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Merges a graph and returns only the nodes and links it added."""
+        new_nodes, new_links = [], []
+        for node in graph_data["nodes"]:
+            if node["id"] not in self.nodes:
+                self.nodes[node["id"]] = node
+                new_nodes.append(node)
+        for link in graph_data["links"]:
+            key = (link["source"], link["target"], link.get("label"))
+            if key not in self.links:
+                self.links[key] = link
+                new_links.append(link)
+        return {"nodes": new_nodes, "links": new_links}
+
+    def relabel(self, labeled_links: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Replaces the co-occurrence link of each labeled pair with the labeled link; returns the links added and removed."""
+        new_links, removed_links = [], []
+        for link in labeled_links:
+            removed = self.links.pop((*sorted((link["source"], link["target"])), COOCCURRENCE_LABEL), None)
+            if removed is not None:
+                removed_links.append(removed)
+            key = (link["source"], link["target"], link["label"])
+            if key not in self.links:
+                self.links[key] = link
+                new_links.append(link)
+        return {"nodes": [], "links": new_links, "removed_links": removed_links}
+
+# --- Dictionary Extraction Fast Path ---
+COOCCURRENCE_LABEL = "co-occurs with"
+
+def _extract_dictionary_graph(article_text: str) -> Dict[str, Any]:
+    """Tags vocabulary entities in one article and links every pair that appears in the same sentence."""
+    pmid, url = _get_first_source(_extract_sources_from_context(article_text))
+    matcher = get_entity_matcher(settings.GRAPH_VOCABULARY_PATH)
+    nodes: Dict[str, Dict[str, Any]] = {}
+    links: Dict[tuple, Dict[str, Any]] = {}
+    for start, end in split_sentences(article_text):
+        names = []
+        for _, _, entity in matcher.find(article_text[start:end]):
+            if entity.name not in nodes:
+                nodes[entity.name] = {"id": entity.name, "label": entity.name, "group": entity.group, "pmid": pmid, "url": url}
+            if entity.name not in names:
+                names.append(entity.name)
+        for i, first in enumerate(names):
+            for second in names[i + 1:]:
+                # Pairs are stored in sorted order so articles mentioning them in either order share a link
+                source, target = sorted((first, second))
+                links.setdefault((source, target), {"source": source, "target": target, "label": COOCCURRENCE_LABEL})
+    return {"nodes": list(nodes.values()), "links": list(links.values())}
+
+async def _label_relations(article_text: str, links: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """Asks Gemini to name the relation behind each co-occurrence link; returns None if the call fails."""
+    pairs = "\n".join(f"- {link['source']} | {link['target']}" for link in links)
+    prompt = f"""
+The entity pairs below co-occur in the biomedical text that follows.
+For each pair the text actually relates, give a short relationship label (e.g., 'treats', 'inhibits', 'is associated with'),
+oriented from the subject to the object. Leave out pairs the text does not relate. Use the entity names exactly as listed.
+Your final output MUST be only a JSON object following this exact structure:
+{{
+  "links": [{{ "source": "EntityName1", "target": "EntityName2", "label": "relationship" }}]
+}}
+Entity pairs:
+{pairs}
+Text to analyze:
+---
+{article_text}"""
+    result = await _call_gemini_for_graph(prompt)
+    if not isinstance(result, dict):
+        return None
+
+    known_pairs = {frozenset((link["source"], link["target"])) for link in links}
+    labeled = []
+    for link in result.get("links") or []:
+        if not isinstance(link, dict) or not isinstance(link.get("label"), str) or not link["label"].strip():
+            continue
+        if frozenset((link.get("source"), link.get("target"))) in known_pairs and link.get("source") != link.get("target"):
+            labeled.append({"source": link["source"], "target": link["target"], "label": link["label"].strip()})
+    return labeled
+
+async def _label_article_relations(article_text: str, links: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+    """Labels one article's co-occurrence links, memoized like extracted graphs; returns [] if labeling fails."""
+    if not links:
+        return []
+    cache_key = hashlib.sha256(f"relations|{settings.GEMINI_GENERATIVE_MODEL}|{article_text}".encode("utf-8")).hexdigest()
+    cached = graph_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    async with semaphore:
+        labeled = await _label_relations(article_text, links)
+    if labeled is None:
+        return []
+    graph_cache.set(cache_key, labeled)
+    return labeled
+
+def _start_dictionary_extractions(context_text: str) -> Tuple[List[Dict[str, Any]], List[asyncio.Task]]:
+    """
+    Extracts every article's co-occurrence graph right away and, when relation labeling is enabled and
+    Gemini is configured, starts one labeling task per article (in the same order).
+    """
+    articles = _split_context_by_article(context_text)
+    graphs = [_extract_dictionary_graph(article) for article in articles]
+    print(f"[GRAPH] Tagged vocabulary entities in {len(articles)} articles.")
+    if not settings.GRAPH_RELATION_LABELING or not settings.GOOGLE_API_KEY:
+        return graphs, []
+    semaphore = asyncio.Semaphore(settings.GRAPH_MAX_CONCURRENCY)
+    tasks = [asyncio.create_task(_label_article_relations(article, graph["links"], semaphore)) for article, graph in zip(articles, graphs)]
+    return graphs, tasks
+
+async def _dictionary_knowledge_graph(context_text: str) -> Dict[str, Any]:
+    """
+    Returns the co-occurrence graph right away, with relation labels for the articles already in the label cache.
+    Other articles are labeled in the background, so their labels are cached for the next request; setting
+    GRAPH_RELATION_TIMEOUT_SECONDS makes the request wait that long for them instead.
+    """
+    graphs, tasks = _start_dictionary_extractions(context_text)
+    merger = _GraphMerger()
+    for graph_data in graphs:
+        merger.add(graph_data)
+    if tasks:
+        # Labeling tasks answered from the cache finish on their first step, before any Gemini call
+        await asyncio.sleep(0)
+        if settings.GRAPH_RELATION_TIMEOUT_SECONDS > 0:
+            await asyncio.wait(tasks, timeout=settings.GRAPH_RELATION_TIMEOUT_SECONDS)
+        pending = [task for task in tasks if not task.done()]
+        for task in tasks:
+            if task.done():
+                merger.relabel(task.result())
+        for task in pending:
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        if pending:
+            print(f"[GRAPH] Labeling relations for {len(pending)} articles in the background; returning their co-occurrence links.")
+    return {"nodes": list(merger.nodes.values()), "links": list(merger.links.values())}
+
+async def _stream_dictionary_knowledge_graph(context_text: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields the whole co-occurrence graph at once, then one update per article Gemini labels. Each update adds
+    the labeled links and lists, under "removed_links", the co-occurrence links they replace.
+    """
+    graphs, tasks = _start_dictionary_extractions(context_text)
+    merger = _GraphMerger()
+    for graph_data in graphs:
+        merger.add(graph_data)
+    if merger.nodes:
+        yield {"nodes": list(merger.nodes.values()), "links": list(merger.links.values())}
+    try:
+        for next_labels in asyncio.as_completed(tasks, timeout=settings.GRAPH_RELATION_STREAM_TIMEOUT_SECONDS):
+            update = merger.relabel(await next_labels)
+            if update["links"] or update["removed_links"]:
+                yield update
+    except asyncio.TimeoutError:
+        print("[GRAPH] Relation labeling timed out; remaining articles keep their co-occurrence links.")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _start_article_extractions(context_text: str) -> List[asyncio.Task]:
+    articles = _split_context_by_article(context_text)
+    print(f"[GRAPH] Extracting entities from {len(articles)} articles concurrently.")
+    semaphore = asyncio.Semaphore(settings.GRAPH_MAX_CONCURRENCY)
+    return [asyncio.create_task(_extract_article_graph(article, semaphore)) for article in articles]
+
+async def stream_knowledge_graph(context_text: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yields the new nodes and links contributed by each article as soon as its extraction finishes."""
+    if settings.GRAPH_EXTRACTION_METHOD == "dictionary":
+        async for update in _stream_dictionary_knowledge_graph(context_text):
+            yield update
+        return
+    if not settings.GOOGLE_API_KEY:
+        print("[GRAPH] FATAL: Gemini client not configured.")
+        return
+
+    tasks = _start_article_extractions(context_text)
+    merger = _GraphMerger()
+    try:
+        for next_graph in asyncio.as_completed(tasks):
+            update = merger.add(await next_graph)
+            if update["nodes"] or update["links"]:
+                yield update
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def generate_knowledge_graph(context_text: str) -> Dict[str, Any]:
+    print("\n--- [GRAPH] Generating Knowledge Graph per article ---")
+
+    if settings.GRAPH_EXTRACTION_METHOD == "dictionary":
+        # Entities come from the local vocabulary; Gemini, if configured, only labels relations
+        with span("knowledge_graph"):
+            final_graph_data = await _dictionary_knowledge_graph(context_text)
+    elif not settings.GOOGLE_API_KEY:
+        print("[GRAPH] FATAL: Gemini client not configured.")
+        return {"nodes": [], "links": []}
+    else:
+        merger = _GraphMerger()
+        with span("knowledge_graph"):
+            for graph_data in await asyncio.gather(*_start_article_extractions(context_text)):
+                merger.add(graph_data)
+        final_graph_data = {"nodes": list(merger.nodes.values()), "links": list(merger.links.values())}
     
     if not final_graph_data["nodes"]:
         print("[GRAPH] FAIL: No valid nodes remained after final validation.")
     else:
-        print(f"[GRAPH] SUCCESS: Parsed graph with {len(validated_nodes)} nodes and {len(validated_links)} links.")
+        print(f"[GRAPH] SUCCESS: Parsed graph with {len(final_graph_data['nodes'])} nodes and {len(final_graph_data['links'])} links.")
     
     return final_graph_data
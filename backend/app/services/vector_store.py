@@ -0,0 +1,117 @@
+import asyncio
+import importlib.util
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .article_store import ArticleStore
+from .index_io import VectorFile, binarize, read_index, set_search_params
+from .embedding_service import embed_texts, local_embedder
+
+
+class LocalVectorStore:
+    """
+    Serves semantic search from the FAISS index and metadata written by scripts/index_data.py.
+
+    The index is loaded once (at application startup); article metadata stays on disk in the
+    article store and only the rows of each search's hits are read. Queries are embedded by the
+    local embedding backend, which uses the same SentenceTransformer model that built the index.
+    """
+
+    def __init__(self, index_path: str, metadata_path: str, vectors_path: str):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.vectors_path = vectors_path
+        self.index = None
+        self.articles: Optional[ArticleStore] = None
+        self.vectors: Optional[np.ndarray] = None  # Memory-mapped float32 rows, used to re-score quantized indexes
+        self.is_binary = False
+        self.rescore = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.index is not None
+
+    def load(self) -> bool:
+        """Loads the index and opens the article store. Returns False if anything is missing."""
+        if not os.path.exists(self.index_path) or not os.path.exists(self.metadata_path):
+            print(f"[LOCAL INDEX] No local index found at {self.index_path}; local search is disabled.")
+            return False
+        if importlib.util.find_spec("sentence_transformers") is None:
+            print("[LOCAL INDEX] sentence-transformers is not installed; local search is disabled.")
+            return False
+        import faiss
+
+        index = read_index(self.index_path, mmap=settings.FAISS_MMAP)
+        set_search_params(index, settings.LOCAL_IVF_NPROBE, settings.LOCAL_HNSW_EF_SEARCH)
+        articles = ArticleStore(self.metadata_path, readonly=True)
+        # The indexer appends to the store every batch but rewrites the index less often, so extra
+        # trailing store rows are articles the saved index does not cover yet
+        if index.ntotal > len(articles):
+            print(f"[LOCAL INDEX] Index has {index.ntotal} vectors but the article store has {len(articles)} rows; local search is disabled.")
+            articles.close()
+            return False
+
+        self.index = index
+        self.articles = articles
+        self.is_binary = isinstance(index, faiss.IndexBinary)
+        vector_file = VectorFile(self.vectors_path, index.d)
+        self.vectors = vector_file.open()[:index.ntotal] if index.ntotal and len(vector_file) >= index.ntotal else None
+        # Flat and HNSW indexes already score with exact vectors; everything else only approximates them
+        exact = isinstance(faiss.downcast_index(index), (faiss.IndexFlat, faiss.IndexHNSWFlat)) if not self.is_binary else False
+        self.rescore = self.vectors is not None and not exact
+        print(f"[LOCAL INDEX] Loaded {index.ntotal} vectors from {self.index_path} (exact re-scoring {'on' if self.rescore else 'off'}).")
+        return True
+
+    def warm_up(self) -> None:
+        """Runs one search so the mapped index pages are read before the first request."""
+        if self.is_loaded:
+            self._search_index(np.zeros((1, self.index.d), dtype=np.float32), 1)
+
+    def _search_index(self, query_embedding: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns approximate cosine scores and row ids of the k nearest rows."""
+        import faiss
+        if self.is_binary:
+            # Sign-hash estimate of the angle: cos(pi * hamming / bits)
+            distances, ids = self.index.search(binarize(query_embedding), k)
+            return np.cos(np.pi * distances[0] / self.index.d), ids[0]
+        distances, ids = self.index.search(query_embedding, k)
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return distances[0], ids[0]
+        # Squared L2 distance between unit vectors (indexes built before inner product): d = 2 - 2 * cos
+        return 1.0 - distances[0] / 2.0, ids[0]
+
+    def _search_sync(self, query_embedding: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        top_k = min(top_k, self.index.ntotal)
+        k = min(top_k * settings.LOCAL_RESCORE_FACTOR, self.index.ntotal) if self.rescore else top_k
+        scores, ids = self._search_index(query_embedding, k)
+        keep = ids >= 0
+        scores, ids = scores[keep], ids[keep]
+        if self.rescore and len(ids):
+            # Exact inner products against the full-precision rows, read in file order
+            read_order = np.argsort(ids)
+            exact = np.empty(len(ids), dtype=np.float32)
+            exact[read_order] = self.vectors[ids[read_order]] @ query_embedding[0]
+            best = np.argsort(-exact, kind="stable")[:top_k]
+            scores, ids = exact[best], ids[best]
+        articles = self.articles.get_rows(ids.tolist())
+        return [{**article, "score": float(score)} for article, score in zip(articles, scores) if article is not None]
+
+    async def search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Returns the top_k nearest articles for the query, best first."""
+        if not self.is_loaded:
+            return []
+        query_embedding = await embed_texts([query], "retrieval_query", local_embedder)
+        return await asyncio.to_thread(self._search_sync, query_embedding, top_k)
+
+
+vector_store = LocalVectorStore(settings.VECTOR_INDEX_PATH, settings.VECTOR_METADATA_PATH, settings.VECTOR_FULL_PRECISION_PATH)
+
+
+def load_vector_store() -> Optional[LocalVectorStore]:
+    """Loads the shared local vector store if it is enabled in settings."""
+    if not settings.LOCAL_INDEX_ENABLED:
+        return None
+    return vector_store if vector_store.load() else None
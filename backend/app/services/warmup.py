@@ -0,0 +1,64 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+from .embedding_service import local_embedder
+from .entity_matcher import get_entity_matcher
+from .vector_store import load_vector_store
+
+# Status of each heavy component: "loading", "ready", "disabled" or "failed: <error>"
+component_status: Dict[str, str] = {}
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def _uses_local_embedder(store_loaded: bool) -> bool:
+    return store_loaded or settings.EMBEDDING_BACKEND == "local" or settings.PRERANK_METHOD == "local"
+
+async def _warm_up() -> None:
+    component_status["vector_store"] = "loading"
+    try:
+        store = await asyncio.to_thread(load_vector_store)
+        component_status["vector_store"] = "ready" if store is not None else "disabled"
+    except Exception as e:
+        store = None
+        component_status["vector_store"] = f"failed: {e}"
+
+    if settings.GRAPH_EXTRACTION_METHOD == "dictionary":
+        component_status["entity_vocabulary"] = "loading"
+        try:
+            await asyncio.to_thread(get_entity_matcher, settings.GRAPH_VOCABULARY_PATH)
+            component_status["entity_vocabulary"] = "ready"
+        except Exception as e:
+            component_status["entity_vocabulary"] = f"failed: {e}"
+
+    if not settings.WARMUP_ENABLED or not _uses_local_embedder(store is not None):
+        component_status["local_embedder"] = "disabled"
+        return
+    component_status["local_embedder"] = "loading"
+    try:
+        await local_embedder.warm_up()
+        if store is not None:
+            await asyncio.to_thread(store.warm_up)
+        component_status["local_embedder"] = "ready"
+    except Exception as e:
+        component_status["local_embedder"] = f"failed: {e}"
+    print(f"[WARMUP] {component_status}")
+
+def start_warmup() -> None:
+    """Loads the local index and warms local models in the background, so the worker accepts connections at once."""
+    global _warmup_task
+    component_status.clear()
+    _warmup_task = asyncio.create_task(_warm_up())
+
+async def stop_warmup() -> None:
+    global _warmup_task
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        await asyncio.gather(_warmup_task, return_exceptions=True)
+        _warmup_task = None
+
+def readiness() -> Tuple[bool, Dict[str, str]]:
+    """Returns whether warm-up has finished without failures, and the status of each component."""
+    done = _warmup_task is not None and _warmup_task.done()
+    ready = done and all(status in ("ready", "disabled") for status in component_status.values())
+    return ready, dict(component_status)
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import types
+from typing import List
+
+import numpy as np
+
+# Model outputs are derived from the input text only, so benchmark runs are repeatable.
+
+def hashed_embedding(text: str, dim: int) -> np.ndarray:
+    """A deterministic bag-of-words embedding: each token adds weight to a hashed dimension."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in text.lower().split():
+        vector[int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little") % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeSentenceTransformer:
+    """Stands in for sentence_transformers.SentenceTransformer with hashed 384-dimensional embeddings."""
+
+    DIM = 384
+
+    def __init__(self, model_name: str, *args, **kwargs):
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.DIM
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        return np.array([hashed_embedding(text, self.DIM) for text in texts], dtype=np.float32)
+
+
+class FakeGenerativeModel:
+    """
+    Stands in for genai.GenerativeModel. Query suggestions echo the query; graph prompts get one node
+    per capitalized word in the analyzed text, linked in order of appearance.
+    """
+
+    def __init__(self, model_name: str, latency: float):
+        self.model_name = model_name
+        self.latency = latency
+
+    async def generate_content_async(self, prompt: str, generation_config=None, request_options=None):
+        await asyncio.sleep(self.latency)
+        if "Text to analyze:" not in prompt:
+            query = re.search(r'User Query: "(.*)"', prompt)
+            return types.SimpleNamespace(text=query.group(1) if query else "")
+        text = prompt.split("Text to analyze:", 1)[1]
+        pmid = re.search(r"pmid:(\S+)", text)
+        entities = list(dict.fromkeys(re.findall(r"\b[A-Z][a-z]{3,}\b", text)))[:8]
+        nodes = [{"id": e, "label": e, "group": "Entity", "pmid": pmid.group(1) if pmid else "unknown"} for e in entities]
+        links = [{"source": a, "target": b, "label": "co-occurs with"} for a, b in zip(entities, entities[1:])]
+        return types.SimpleNamespace(text=json.dumps({"nodes": nodes, "links": links}))
+
+
+def install_fake_models(embedding_latency: float, generation_latency: float, embedding_dim: int = 768) -> None:
+    """Replaces the Gemini client functions and the sentence_transformers module with deterministic fakes."""
+    import google.generativeai as genai
+
+    async def embed_content_async(model, content, task_type=None, **kwargs):
+        await asyncio.sleep(embedding_latency)
+        texts = [content] if isinstance(content, str) else list(content)
+        vectors = [hashed_embedding(text, embedding_dim).tolist() for text in texts]
+        return {"embedding": vectors[0] if isinstance(content, str) else vectors}
+
+    genai.embed_content_async = embed_content_async
+    genai.GenerativeModel = lambda model_name, *args, **kwargs: FakeGenerativeModel(model_name, generation_latency)
+
+    fake_module = types.ModuleType("sentence_transformers")
+    fake_module.SentenceTransformer = FakeSentenceTransformer
+    sys.modules["sentence_transformers"] = fake_module
@@ -0,0 +1,229 @@
+import json
+import os
+import random
+import re
+import threading
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, FrozenSet, List, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from app.services.pubmed_parser import PubmedArticleParser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+RECORDED_EFETCH_PATH = os.path.join(FIXTURES_DIR, "efetch.xml")
+RECORDED_ESEARCH_PATH = os.path.join(FIXTURES_DIR, "esearch.json")
+FIRST_PUBLICATION_DATE = date(2000, 1, 1)
+
+_WORDS = (
+    "covid vaccine myocarditis cancer tumor gene therapy insulin diabetes patients trial randomized "
+    "cohort mortality risk inflammation receptor protein kinase inhibitor antibody infection sepsis "
+    "cardiac renal hepatic outcome dose placebo efficacy safety mutation expression pathway cells mice "
+    "biomedical research clinical trials life sciences"
+).split()
+_WORD_RE = re.compile(r"\w+")
+_FIELD_TAG_RE = re.compile(r"\[[^\]]*\]")
+
+
+def load_recorded_articles() -> List[Dict[str, Any]]:
+    """Parses the efetch XML captured by benchmarks.record_fixtures, if present."""
+    if not os.path.exists(RECORDED_EFETCH_PATH):
+        return []
+    parser = PubmedArticleParser()
+    with open(RECORDED_EFETCH_PATH, "rb") as f:
+        articles = parser.feed(f.read())
+    return articles + parser.close()
+
+def load_recorded_searches() -> Dict[str, List[str]]:
+    """Reads the esearch ID lists captured by benchmarks.record_fixtures, keyed by search term."""
+    if not os.path.exists(RECORDED_ESEARCH_PATH):
+        return {}
+    with open(RECORDED_ESEARCH_PATH, encoding="utf-8") as f:
+        return {term: search["idlist"] for term, search in json.load(f).items()}
+
+def _synthetic_article(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "title": " ".join(rng.choice(_WORDS) for _ in range(10)).capitalize(),
+        "abstract": " ".join(rng.choice(_WORDS) for _ in range(200)),
+        "authors": ", ".join(f"{rng.choice('ABCDEFGH')} Author{rng.randint(1, 500)}" for _ in range(4)),
+    }
+
+def build_corpus(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Builds a deterministic corpus of `size` articles. Recorded articles are replayed in a cycle
+    when available, otherwise synthetic ones are generated. Every article gets a unique PMID and
+    a publication date one day after the previous article; recorded ones keep their real PMID as
+    `source_pmid`, which recorded searches are matched against.
+    """
+    rng = random.Random(seed)
+    recorded = load_recorded_articles()
+    corpus = []
+    for i in range(size):
+        source = recorded[i % len(recorded)] if recorded else _synthetic_article(rng)
+        pmid = str(10_000_000 + i)
+        corpus.append({
+            "pmid": pmid,
+            "title": source["title"],
+            "abstract": source["abstract"],
+            "authors": source["authors"],
+            "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            "published": FIRST_PUBLICATION_DATE + timedelta(days=i),
+            "source_pmid": source.get("pmid"),
+        })
+    return corpus
+
+def render_efetch_xml(articles: List[Dict[str, Any]]) -> bytes:
+    """Renders articles in the efetch PubmedArticleSet format understood by PubmedArticleParser."""
+    parts = ['<?xml version="1.0" ?>\n<PubmedArticleSet>']
+    for article in articles:
+        authors = "".join(
+            f"<Author><LastName>{escape(name.split(' ', 1)[1])}</LastName><ForeName>{escape(name.split(' ', 1)[0])}</ForeName></Author>"
+            for name in article["authors"].split(", ") if " " in name
+        )
+        parts.append(
+            f"<PubmedArticle><MedlineCitation><PMID Version=\"1\">{article['pmid']}</PMID><Article>"
+            f"<Journal><JournalIssue><PubDate><Year>{article['published'].year}</Year></PubDate></JournalIssue></Journal>"
+            f"<ArticleTitle>{escape(article['title'])}</ArticleTitle>"
+            f"<Abstract><AbstractText>{escape(article['abstract'])}</AbstractText></Abstract>"
+            f"<AuthorList>{authors}</AuthorList></Article></MedlineCitation></PubmedArticle>"
+        )
+    parts.append("</PubmedArticleSet>")
+    return "".join(parts).encode("utf-8")
+
+
+class FakePubmedServer:
+    """
+    A local stand-in for the E-utilities base URL that answers esearch, esummary and efetch from a fixed corpus.
+
+    esearch replays a recorded term's ID list as the corpus copies of those articles. Any other term
+    matches the articles whose title or abstract contains every word of one of its OR-separated parts
+    (AND and field tags such as [ti] are ignored). esearch honours retmax, retstart and mindate/maxdate;
+    esummary and efetch accept either an id list or the WebEnv/query_key of a previous esearch
+    together with retstart/retmax.
+    """
+
+    def __init__(self, corpus: List[Dict[str, Any]], searches: Optional[Dict[str, List[str]]] = None):
+        self.searches = load_recorded_searches() if searches is None else searches
+        self.set_corpus(corpus)
+        self.histories: Dict[str, List[Dict[str, Any]]] = {}
+        self.request_counts = {"esearch": 0, "esummary": 0, "efetch": 0}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_corpus(self, corpus: List[Dict[str, Any]]) -> None:
+        self.corpus = corpus
+        self.by_pmid = {article["pmid"]: article for article in corpus}
+        self._words: Dict[str, FrozenSet[str]] = {}
+        self._term_matches: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _article_words(self, article: Dict[str, Any]) -> FrozenSet[str]:
+        words = self._words.get(article["pmid"])
+        if words is None:
+            words = frozenset(_WORD_RE.findall(f"{article['title']} {article['abstract']}".lower()))
+            self._words[article["pmid"]] = words
+        return words
+
+    def _search_term(self, term: str) -> List[Dict[str, Any]]:
+        if term in self.searches:
+            recorded = set(self.searches[term])
+            return [a for a in self.corpus if a.get("source_pmid") in recorded]
+        parts = _FIELD_TAG_RE.sub(" ", term).replace(" AND ", " ").split(" OR ")
+        alternatives = [set(_WORD_RE.findall(part.lower())) for part in parts]
+        alternatives = [words for words in alternatives if words]
+        if not alternatives:
+            return self.corpus
+        return [a for a in self.corpus if any(words <= self._article_words(a) for words in alternatives)]
+
+    def _matches(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        term = " ".join(params.get("term", "").split())
+        with self._lock:
+            matches = self._term_matches.get(term)
+            if matches is None:
+                matches = self._term_matches[term] = self._search_term(term)
+        if params.get("mindate"):
+            mindate = datetime.strptime(params["mindate"], "%Y/%m/%d").date()
+            matches = [a for a in matches if a["published"] >= mindate]
+        if params.get("maxdate"):
+            maxdate = datetime.strptime(params["maxdate"], "%Y/%m/%d").date()
+            matches = [a for a in matches if a["published"] <= maxdate]
+        return matches
+
+    def esearch(self, params: Dict[str, str]) -> bytes:
+        matches = self._matches(params)
+        retstart, retmax = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+        with self._lock:
+            self.request_counts["esearch"] += 1
+            webenv = f"MCID_bench_{len(self.histories)}"
+            self.histories[webenv] = matches
+        return json.dumps({"esearchresult": {
+            "count": str(len(matches)),
+            "retmax": str(retmax),
+            "retstart": str(retstart),
+            "idlist": [a["pmid"] for a in matches[retstart:retstart + retmax]],
+            "querykey": "1",
+            "webenv": webenv,
+        }}).encode("utf-8")
+
+    def _requested_articles(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        if params.get("WebEnv"):
+            matches = self.histories.get(params["WebEnv"], [])
+            retstart, retmax = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+            return matches[retstart:retstart + retmax]
+        return [self.by_pmid[pmid] for pmid in params.get("id", "").split(",") if pmid in self.by_pmid]
+
+    def esummary(self, params: Dict[str, str]) -> bytes:
+        with self._lock:
+            self.request_counts["esummary"] += 1
+        articles = self._requested_articles(params)
+        result: Dict[str, Any] = {"uids": [a["pmid"] for a in articles]}
+        for article in articles:
+            result[article["pmid"]] = {"uid": article["pmid"], "title": article["title"]}
+        return json.dumps({"result": result}).encode("utf-8")
+
+    def efetch(self, params: Dict[str, str]) -> bytes:
+        with self._lock:
+            self.request_counts["efetch"] += 1
+        return render_efetch_xml(self._requested_articles(params))
+
+    def start(self) -> "FakePubmedServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if url.path.endswith("/esearch.fcgi"):
+                    body, content_type = fake.esearch(params), "application/json"
+                elif url.path.endswith("/esummary.fcgi"):
+                    body, content_type = fake.esummary(params), "application/json"
+                elif url.path.endswith("/efetch.fcgi"):
+                    body, content_type = fake.efetch(params), "text/xml"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.index_io import INDEX_TYPES, binarize, create_index, set_search_params
+
+# Recall-vs-memory report for the local index types. Run from the backend directory:
+#   python -m benchmarks.quantization --dim 384 --rescore-factors 1 4 10 --json quantization.json
+# Vectors come from the full-precision file written by scripts/index_data.py; without one, a synthetic
+# clustered set is used. Held-out rows serve as queries and exact inner product is the ground truth.
+
+
+def load_vectors(args: argparse.Namespace) -> np.ndarray:
+    if os.path.exists(args.vectors):
+        vectors = np.fromfile(args.vectors, dtype=np.float32).reshape(-1, args.dim)
+        print(f"Using {min(len(vectors), args.sample)} of {len(vectors)} vectors from {args.vectors}.")
+        return np.ascontiguousarray(vectors[:args.sample])
+    print(f"No vector file at {args.vectors}; using {args.sample} synthetic vectors.")
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((max(args.sample // 100, 1), args.dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), args.sample)] + 0.5 * rng.standard_normal((args.sample, args.dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def index_bytes(index) -> int:
+    import faiss
+    if isinstance(index, faiss.IndexBinary):
+        return int(faiss.serialize_index_binary(index).nbytes)
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def evaluate(index_type: str, database: np.ndarray, queries: np.ndarray, truth: np.ndarray, args: argparse.Namespace) -> Dict[str, Any]:
+    import faiss
+    index = create_index(index_type, args.dim, args.nlist, args.pq_m, args.hnsw_m)
+    is_binary = isinstance(index, faiss.IndexBinary)
+    if not index.is_trained:
+        index.train(database[:args.train_size])
+    index.add(binarize(database) if is_binary else database)
+    # The same query-time parameters the vector store applies when serving the index
+    set_search_params(index, args.nprobe, args.ef_search)
+
+    result = {"index_type": index_type, "bytes_per_vector": index_bytes(index) / len(database)}
+    result["index_mib"] = result["bytes_per_vector"] * len(database) / 2**20
+    for factor in args.rescore_factors:
+        start = time.perf_counter()
+        _, ids = index.search(binarize(queries) if is_binary else queries, args.k * factor)
+        if factor > 1:
+            # Same exact re-scoring as the vector store: inner products against the float32 rows
+            exact = np.einsum("qkd,qd->qk", database[np.maximum(ids, 0)], queries)
+            exact[ids < 0] = -np.inf
+            ids = np.take_along_axis(ids, np.argsort(-exact, axis=1)[:, :args.k], axis=1)
+        result[f"recall@{args.k}_x{factor}"] = recall(ids[:, :args.k], truth)
+        result[f"ms_per_query_x{factor}"] = (time.perf_counter() - start) * 1000 / len(queries)
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recall and memory of each local index type, with and without exact re-scoring.")
+    parser.add_argument("--vectors", default=settings.VECTOR_FULL_PRECISION_PATH, help="Full-precision vector file written by the indexer.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension of the vector file.")
+    parser.add_argument("--sample", type=int, default=100000, help="Maximum vectors to index.")
+    parser.add_argument("--queries", type=int, default=500, help="Held-out vectors used as queries.")
+    parser.add_argument("--k", type=int, default=10, help="Recall is measured at this cutoff.")
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, settings.LOCAL_RESCORE_FACTOR, 10],
+                        help="Candidates fetched per result before exact re-scoring (1 means no re-scoring).")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=settings.LOCAL_IVF_NPROBE, help="IVF lists scanned per query (default: LOCAL_IVF_NPROBE, as served).")
+    parser.add_argument("--ef-search", type=int, default=settings.LOCAL_HNSW_EF_SEARCH, help="HNSW candidate list size (default: LOCAL_HNSW_EF_SEARCH, as served).")
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--train-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    vectors = load_vectors(args)
+    database, queries = vectors[:-args.queries], vectors[-args.queries:]
+    truth = np.argsort(-(queries @ database.T), axis=1)[:, :args.k]
+
+    print(f"Searching with nprobe={args.nprobe} (ivfpq) and efSearch={args.ef_search} (hnsw).")
+    columns = [f"recall@{args.k}_x{factor}" for factor in args.rescore_factors]
+    print(f"{'index':<9}{'bytes/vec':>11}{'index MiB':>11}" + "".join(f"{column:>18}" for column in columns))
+    results: List[Dict[str, Any]] = []
+    for index_type in args.index_types:
+        result = evaluate(index_type, database, queries, truth, args)
+        results.append(result)
+        print(f"{index_type:<9}{result['bytes_per_vector']:>11.1f}{result['index_mib']:>11.1f}" + "".join(f"{result[column]:>18.3f}" for column in columns))
+    print(f"Exact re-scoring reads {args.dim * 4} bytes per candidate from the memory-mapped vector file, which stays on disk.")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "vectors": len(database), "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+from typing import List
+
+import httpx
+
+from app.core.config import settings
+from scripts.index_data import INDEXING_QUERY
+from .fixtures import FIXTURES_DIR, RECORDED_EFETCH_PATH, RECORDED_ESEARCH_PATH
+from .run import QUERY
+
+# Records real esearch results and efetch XML once (network required) so benchmarks can replay them offline:
+#   python -m benchmarks.record_fixtures --queries "covid vaccine myocarditis" "sepsis mortality" --count 100
+# Until they have been recorded (and committed under benchmarks/fixtures), benchmarks use the synthetic corpus.
+
+def record(queries: List[str], count: int) -> None:
+    common = {"db": "pubmed", "api_key": settings.PUBMED_API_KEY}
+    searches = {}
+    with httpx.Client(base_url=settings.PUBMED_API_BASE_URL, timeout=60.0) as client:
+        for query in queries:
+            # Keyed by the term as the app sends it, which only normalizes whitespace
+            term = " ".join(query.split())
+            search = client.get("/esearch.fcgi", params={**common, "term": term, "retmax": count, "format": "json"})
+            search.raise_for_status()
+            result = search.json()["esearchresult"]
+            searches[term] = {"count": int(result["count"]), "idlist": result["idlist"]}
+        pmids = list(dict.fromkeys(pmid for search in searches.values() for pmid in search["idlist"]))
+        # POST keeps the URL short when several queries' PMIDs are fetched at once
+        fetch = client.post("/efetch.fcgi", data={**common, "id": ",".join(pmids), "retmode": "xml"})
+        fetch.raise_for_status()
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(RECORDED_ESEARCH_PATH, "w", encoding="utf-8") as f:
+        json.dump(searches, f, indent=1)
+    with open(RECORDED_EFETCH_PATH, "wb") as f:
+        f.write(fetch.content)
+    print(f"Recorded {len(searches)} searches and {len(pmids)} articles to {FIXTURES_DIR}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record esearch results and efetch XML for offline benchmarks.")
+    parser.add_argument("--queries", nargs="+", default=[QUERY, INDEXING_QUERY], help="Search terms to record; defaults to the ones the benchmarks run.")
+    parser.add_argument("--count", type=int, default=100, help="PMIDs recorded per search.")
+    args = parser.parse_args()
+    record(args.queries, args.count)
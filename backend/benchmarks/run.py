@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List
+
+import numpy as np
+
+from .fakes import install_fake_models
+from .fixtures import FakePubmedServer, build_corpus
+
+# Offline benchmarks for the search path. Run from the backend directory:
+#   python -m benchmarks.run --sizes 100 1000 5000 --iterations 10 --json bench.json
+# PubMed is replaced by a local E-utilities stand-in replaying recorded searches and articles
+# (benchmarks/fixtures/esearch.json and efetch.xml) or serving synthetic ones, and Gemini/SentenceTransformer
+# by deterministic fakes with configurable latency.
+
+BENCHMARKS = ["fetch_article_details", "hybrid_search", "paginated_search", "generate_knowledge_graph", "dictionary_knowledge_graph", "build_index"]
+QUERY = "covid vaccine myocarditis"
+MAX_GRAPH_ARTICLES = 50
+
+
+def configure_environment(base_url: str, args: argparse.Namespace) -> None:
+    """Points the app at the fakes; must run before any app module is imported."""
+    os.environ.update({
+        "PUBMED_API_BASE_URL": base_url,
+        "PUBMED_REQUESTS_PER_SECOND": str(args.rate_limit),
+        "PUBMED_CACHE_DB_PATH": "",
+        "SEARCH_CURSOR_DB_PATH": "",
+        "SEARCH_CANDIDATE_POOL_SIZE": str(max(args.sizes)),
+        "GOOGLE_API_KEY": "benchmark",
+        "EMBEDDING_BACKEND": "gemini",
+        "EMBEDDING_CACHE_ENABLED": str(args.warm).lower(),
+        "LOCAL_INDEX_ENABLED": "false",
+    })
+    install_fake_models(args.embedding_latency, args.generation_latency)
+
+
+def clear_caches() -> None:
+    from app.services import pubmed_service, search_service
+    for cache in (pubmed_service.search_cache, pubmed_service.article_cache):
+        if cache is not None:
+            cache.memory.clear()
+    search_service.suggestion_cache.clear()
+    search_service.graph_cache.clear()
+    search_service.cursor_cache.memory.clear()
+    search_service.semantic_cache.clear()
+
+
+async def dictionary_knowledge_graph(context_text: str) -> Any:
+    """generate_knowledge_graph on the local fast path: vocabulary entities and co-occurrence links, no Gemini calls."""
+    from app.core.config import settings
+    from app.services import search_service
+    previous = settings.GRAPH_EXTRACTION_METHOD, settings.GRAPH_RELATION_LABELING
+    settings.GRAPH_EXTRACTION_METHOD, settings.GRAPH_RELATION_LABELING = "dictionary", False
+    try:
+        return await search_service.generate_knowledge_graph(context_text)
+    finally:
+        settings.GRAPH_EXTRACTION_METHOD, settings.GRAPH_RELATION_LABELING = previous
+
+
+async def measure(name: str, size: int, articles: int, op: Callable[[], Awaitable[Any]], server: FakePubmedServer, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs op repeatedly and returns latency percentiles, throughput, upstream calls and peak traced memory.
+    `articles` is the number of articles one operation processes, used for the articles/s figure.
+    """
+    latencies = []
+    requests_before = sum(server.request_counts.values())
+    for _ in range(args.iterations):
+        if not args.warm:
+            clear_caches()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            await op()
+            latencies.append(time.perf_counter() - start)
+    upstream_requests = sum(server.request_counts.values()) - requests_before
+
+    # Peak memory is measured in a separate pass because tracing slows every allocation down
+    if not args.warm:
+        clear_caches()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        "benchmark": name,
+        "size": size,
+        "iterations": args.iterations,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "ops_per_s": args.iterations / total,
+        "articles_per_s": articles * args.iterations / total,
+        "upstream_requests_per_op": upstream_requests / args.iterations,
+        "peak_mib": peak / 2**20,
+    }
+
+
+async def run_benchmarks(server: FakePubmedServer, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.services import pubmed_service, search_service
+    from scripts import index_data
+
+    results = []
+    for size in args.sizes:
+        server.set_corpus(build_corpus(size, seed=args.seed))
+        pmids = [article["pmid"] for article in server.corpus]
+        graph_context = "\n\n".join(
+            f"From article pmid:{a['pmid']} url:{a['url']}: {a['title']}. {a['abstract']}" for a in server.corpus[:MAX_GRAPH_ARTICLES]
+        )
+        ops = {
+            "fetch_article_details": (size, lambda: pubmed_service.fetch_article_details(pmids)),
+            "hybrid_search": (size, lambda: search_service.hybrid_search(QUERY, None, top_k=size, check_suggestion=True)),
+            # Time to the first page of 20 with the whole corpus as the ranked candidate pool
+            "paginated_search": (size, lambda: search_service.paginated_search(QUERY, None, 20, check_suggestion=True)),
+            "generate_knowledge_graph": (min(size, MAX_GRAPH_ARTICLES), lambda: search_service.generate_knowledge_graph(graph_context)),
+            "dictionary_knowledge_graph": (min(size, MAX_GRAPH_ARTICLES), lambda: dictionary_knowledge_graph(graph_context)),
+            "build_index": (size, lambda: index_data.build_index(index_data.parse_args(["--fresh", "--max-articles", str(size)]))),
+        }
+        for name in args.benchmarks:
+            articles, op = ops[name]
+            result = await measure(name, size, articles, op, server, args)
+            results.append(result)
+            print(format_row(result))
+    await pubmed_service.close_http_client()
+    return results
+
+
+def format_row(result: Dict[str, Any]) -> str:
+    return (
+        f"{result['benchmark']:<26}{result['size']:>7}{result['p50_ms']:>11.1f}{result['p95_ms']:>11.1f}{result['p99_ms']:>11.1f}"
+        f"{result['ops_per_s']:>9.2f}{result['articles_per_s']:>12.0f}{result['upstream_requests_per_op']:>10.1f}{result['peak_mib']:>10.1f}"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline latency, throughput and memory benchmarks for the search path.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Corpus sizes (articles per operation).")
+    parser.add_argument("--iterations", type=int, default=10, help="Timed runs per benchmark and size.")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Simulated seconds per Gemini embedding call.")
+    parser.add_argument("--generation-latency", type=float, default=0.2, help="Simulated seconds per Gemini generation call.")
+    parser.add_argument("--rate-limit", type=float, default=1000, help="PubMed requests per second allowed by the client limiter.")
+    parser.add_argument("--warm", action="store_true", help="Keep caches between iterations instead of measuring cold requests.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    server = FakePubmedServer([]).start()
+    configure_environment(f"{server.base_url}/entrez/eutils", args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Import-time messages from the app would otherwise interleave with the results table
+        from app.services import search_service  # noqa: F401
+
+    # Caches, indexes and checkpoints are written under a throwaway working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        print(f"{'benchmark':<26}{'size':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>9}{'articles/s':>12}{'upstream':>10}{'peak MiB':>10}")
+        try:
+            results = asyncio.run(run_benchmarks(server, args))
+        finally:
+            server.stop()
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {json_path}.")
+
+if __name__ == "__main__":
+    main()
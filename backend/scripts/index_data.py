@@ -1,95 +1,355 @@
 import os
+import argparse
 import asyncio
-import aiohttp
 import numpy as np
 import faiss # convert too qdrant or chromdb better for hosting
 import json
-from xml.etree import ElementTree
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 
-# add a blueprin befroe hosting
-
-BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils" # read documentations
-
-async def fetch_article_ids(query: str, count: int = 10):
-    """Fetch article IDs from PubMed for a given query."""
-    url = f"{BASE_URL}/esearch.fcgi"
-    params = {"db": "pubmed", "term": query, "retmax": count, "retmode": "json"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as resp:
-            data = await resp.json()
-            return data.get("esearchresult", {}).get("idlist", [])
-
-async def fetch_article_details(article_ids, batch_size: int = 200):
-    """Fetch details for a list of PubMed article IDs."""
-    articles = []
-    async with aiohttp.ClientSession() as session:
-        for i in range(0, len(article_ids), batch_size):
-            batch_pmids = article_ids[i:i+batch_size]
-            pmid_string = ",".join(str(p) for p in batch_pmids)
-
-            url = f"{BASE_URL}/efetch.fcgi"
-            params = {"db": "pubmed", "id": pmid_string, "retmode": "xml"}
-
-            async with session.get(url, params=params) as resp:
-                xml_text = await resp.text()
-                root = ElementTree.fromstring(xml_text)
-
-                for article in root.findall(".//PubmedArticle"):
-                    pmid = article.findtext(".//PMID")
-                    title = article.findtext(".//ArticleTitle")
-                    abstract_texts = [a.text for a in article.findall(".//AbstractText") if a.text]
-                    abstract = " ".join(abstract_texts).strip()
-
-                    articles.append({
-                        "pmid": pmid,
-                        "title": title,
-                        "abstract": abstract
-                    })
-    return articles
+from app.core.config import settings
+from app.services.article_store import ArticleStore
+from app.services.index_io import INDEX_TYPES, VectorFile, binarize, create_index, read_index, write_index
+from app.services.pubmed_service import _make_api_request, close_http_client, efetch_articles
+
+# Run from the backend directory: python -m scripts.index_data --help
+
+BASE_URL = settings.PUBMED_API_BASE_URL # read documentations
 
 INDEXING_QUERY = "biomedical research OR clinical trials OR life sciences"
-NUM_ARTICLES_TO_INDEX = 5  # keep small for testing -> dont got for higher numbers it may increase the latency exponentially 
+NUM_ARTICLES_TO_INDEX = 1000  # default cap per run; pass --max-articles 0 to index every match
 
-async def build_index():
-    print("--- Starting the indexing process with SentenceTransformers ---")
+# PubMed's esearch/efetch history can only page through the first 10,000 records of a search,
+# so larger result sets are split into publication-date windows that each stay below the limit.
+MAX_RECORDS_PER_WINDOW = 9999
+EFETCH_BATCH_SIZE = 200
+EMBEDDING_BATCH_SIZE = 1000
+DATE_FORMAT = "%Y/%m/%d"
+EARLIEST_PUBLICATION_DATE = "1781/01/01"
+
+CHECKPOINT_PATH = "data/index_checkpoint.json"
+TRAIN_BUFFER_PATH = "data/index_train_buffer.npy"
+SQ8_TRAIN_SIZE = 10000
+INDEX_SAVE_INTERVAL = 10  # Embedding batches between index rewrites; the article store and vector file are appended every batch
+RESTORE_CHUNK_SIZE = 100_000
+LEGACY_METADATA_PATH = "data/indexed_articles.jsonl"  # Metadata format used before the SQLite article store
+
+
+async def search_history(query: str, mindate: date, maxdate: date) -> Tuple[str, str, int]:
+    """Runs esearch on the history server and returns (WebEnv, query_key, count) for a date window."""
+    params = {
+        "db": "pubmed",
+        "term": query,
+        "retmax": 0,
+        "usehistory": "y",
+        "datetype": "pdat",
+        "mindate": mindate.strftime(DATE_FORMAT),
+        "maxdate": maxdate.strftime(DATE_FORMAT),
+        "api_key": settings.PUBMED_API_KEY,
+        "format": "json"
+    }
+    response = await _make_api_request(f"{BASE_URL}/esearch.fcgi", params)
+    result = response.json().get("esearchresult", {})
+    return result.get("webenv", ""), result.get("querykey", ""), int(result.get("count", "0"))
+
+async def fetch_history_batch(webenv: str, query_key: str, retstart: int, retmax: int) -> List[Dict[str, Any]]:
+    """Fetches one efetch page of article details from a stored esearch result."""
+    params = {
+        "db": "pubmed",
+        "WebEnv": webenv,
+        "query_key": query_key,
+        "retstart": retstart,
+        "retmax": retmax,
+        "retmode": "xml",
+        "api_key": settings.PUBMED_API_KEY
+    }
+    articles = await efetch_articles(params)
+    return [
+        {"pmid": a["pmid"], "title": a["title"], "abstract": a["abstract"], "authors": a["authors"], "year": a["year"]}
+        for a in articles
+    ]
+
+async def iter_date_windows(query: str, mindate: date, maxdate: date) -> AsyncIterator[Tuple[date, date, str, str, int]]:
+    """
+    Yields (mindate, maxdate, WebEnv, query_key, count) windows in chronological order.
+    Windows holding more than MAX_RECORDS_PER_WINDOW records are split in half until they fit.
+    """
+    pending = [(mindate, maxdate)]
+    while pending:
+        start, end = pending.pop()
+        webenv, query_key, count = await search_history(query, start, end)
+        if count > MAX_RECORDS_PER_WINDOW and start < end:
+            middle = start + (end - start) // 2
+            # Push the later half first so the earlier half is processed next
+            pending.append((middle + timedelta(days=1), end))
+            pending.append((start, middle))
+            continue
+        if count > MAX_RECORDS_PER_WINDOW:
+            print(f"Warning: {count} records published on {start} exceed the history limit; only the first {MAX_RECORDS_PER_WINDOW} are indexed.")
+        if count:
+            yield start, end, webenv, query_key, min(count, MAX_RECORDS_PER_WINDOW)
+
+
+async def resume_date_windows(query: str, checkpoint: Dict[str, Any], mindate: date, maxdate: date) -> AsyncIterator[Tuple[date, date, str, str, int]]:
+    """
+    Yields the window a checkpoint stopped in with its exact bounds, then the windows after it.
+    Splitting again from the window's start could end the first window on another date, so the
+    saved offset would point into a different set of records.
+    """
+    if checkpoint.get("window_end"):
+        start = datetime.strptime(checkpoint["window_start"], DATE_FORMAT).date()
+        end = datetime.strptime(checkpoint["window_end"], DATE_FORMAT).date()
+        # A fresh esearch over the same bounds lists the same records in the same order; the saved WebEnv may have expired
+        webenv, query_key, count = await search_history(query, start, end)
+        if count:
+            yield start, end, webenv, query_key, min(count, MAX_RECORDS_PER_WINDOW)
+        mindate = end + timedelta(days=1)
+    if mindate <= maxdate:
+        async for window in iter_date_windows(query, mindate, maxdate):
+            yield window
+
+
+class IncrementalIndexer:
+    """
+    Appends embedded articles to a FAISS index, its article store and the full-precision vector
+    file, keeping row i of each aligned with vector i of the index. Vectors for an untrained
+    (IVF-PQ or SQ8) index are buffered until enough have been collected to train it.
+
+    The article store and vector file are appended on every batch and are the checkpoint; the
+    index file is only rewritten every `save_interval` batches and by save(), and rows it is
+    missing on the next start are restored from the vector file. Indexes built without a vector
+    file are still rewritten on every batch.
+    """
+
+    def __init__(self, index_path: str, metadata_path: str, vectors_path: str, index_type: str, dim: int, nlist: int, pq_m: int, hnsw_m: int, train_size: int, save_interval: int = INDEX_SAVE_INTERVAL):
+        self.index_path = index_path
+        self.train_size = train_size
+        self.save_interval = save_interval
+        self.train_buffer: Optional[np.ndarray] = None
+        self._unsaved_batches = 0
+
+        if os.path.exists(index_path):
+            self.index = read_index(index_path)
+            print(f"Appending to existing index with {self.index.ntotal} vectors.")
+        else:
+            self.index = create_index(index_type, dim, nlist, pq_m, hnsw_m)
+
+        self.store = ArticleStore(metadata_path)
+        if len(self.store) == 0 and os.path.exists(LEGACY_METADATA_PATH):
+            migrate_legacy_metadata(LEGACY_METADATA_PATH, self.store)
+
+        self.vectors: Optional[VectorFile] = VectorFile(vectors_path, dim)
+        if len(self.vectors) == 0 and (self.index.ntotal > 0 or os.path.exists(TRAIN_BUFFER_PATH)):
+            print("This index was built without full-precision vectors; exact re-scoring stays off until it is rebuilt with --fresh.")
+            self.vectors = None
+            if not self.index.is_trained and os.path.exists(TRAIN_BUFFER_PATH):
+                self.train_buffer = np.load(TRAIN_BUFFER_PATH)
+            self._reconcile_store()
+        else:
+            self._restore_from_vectors()
+
+    @property
+    def row_count(self) -> int:
+        buffered = len(self.train_buffer) if self.train_buffer is not None else 0
+        return self.index.ntotal + buffered
+
+    def _restore_from_vectors(self) -> None:
+        """Aligns the store and vector file, then adds the rows the last saved index is missing."""
+        saved = min(len(self.store), len(self.vectors))
+        if self.index.ntotal > saved:
+            raise RuntimeError(f"The index holds {self.index.ntotal} vectors but only {saved} articles were saved; rebuild with --fresh.")
+        if len(self.store) > saved:
+            print(f"Discarding {len(self.store) - saved} article rows from an interrupted batch.")
+            self.store.truncate(saved)
+        if len(self.vectors) > saved:
+            self.vectors.truncate(saved)
+        if saved > self.index.ntotal:
+            print(f"Restoring {saved - self.index.ntotal} index rows from the vector file...")
+            vectors = self.vectors.open()
+            for start in range(self.index.ntotal, saved, RESTORE_CHUNK_SIZE):
+                self._add_to_index(np.array(vectors[start:min(start + RESTORE_CHUNK_SIZE, saved)]))
+            del vectors
+
+    def _reconcile_store(self) -> None:
+        """Drops store rows written after the last saved index state."""
+        stored = len(self.store)
+        if stored < self.row_count:
+            raise RuntimeError(f"Article store has {stored} rows but the index holds {self.row_count}; rebuild with --fresh.")
+        if stored > self.row_count:
+            print(f"Discarding {stored - self.row_count} article rows from an interrupted batch.")
+            self.store.truncate(self.row_count)
 
-    print(f"Fetching {NUM_ARTICLES_TO_INDEX} article IDs for query: '{INDEXING_QUERY}'...")
-    article_ids = await fetch_article_ids(INDEXING_QUERY, count=NUM_ARTICLES_TO_INDEX)
-    if not article_ids:
-        print("No articles found. Exiting.")
-        return
-
-    print(f"Fetching details for {len(article_ids)} articles...")
-    articles = await fetch_article_details(article_ids)
-    articles_to_index = [a for a in articles if a.get("abstract")]
-    print(f"Found {len(articles_to_index)} articles with abstracts.")
-    if not articles_to_index:
-        return
-
-    for art in articles_to_index:
-        print(f"PMID: {art['pmid']}") 
-        print(f"Title: {art['title']}")
-        print(f"Abstract: {art['abstract'][:200]}...")  # use this to scrap and get  the data out
-        print("-" * 80)
-
-    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2") #replace for medium if u want but latency adjustment required 
-    article_texts = [a["abstract"] for a in articles_to_index]
-    embeddings = model.encode(article_texts, convert_to_numpy=True)
-    print(f"Embeddings generated. Shape: {embeddings.shape}")
-
-    embedding_dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(embedding_dim)
-    index.add(embeddings)
+    def new_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Returns the articles with an abstract that are not in the store yet."""
+        known = self.store.existing_pmids(a["pmid"] for a in articles)
+        return [a for a in articles if a.get("abstract") and a["pmid"] not in known]
+
+    def add(self, articles: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Appends a batch of articles and their embeddings, rewriting the index every save_interval batches."""
+        self.store.append(articles)
+        if self.vectors is not None:
+            self.vectors.append(embeddings)
+        self._add_to_index(embeddings)
+        self._unsaved_batches += 1
+        if self.vectors is None or self._unsaved_batches >= self.save_interval:
+            self.save()
+
+    def _add_to_index(self, embeddings: np.ndarray) -> None:
+        if isinstance(self.index, faiss.IndexBinary):
+            self.index.add(binarize(embeddings))
+        elif self.index.is_trained:
+            self.index.add(embeddings)
+        else:
+            self.train_buffer = embeddings if self.train_buffer is None else np.vstack([self.train_buffer, embeddings])
+            if len(self.train_buffer) >= self.train_size:
+                self.train()
+
+    def train(self) -> None:
+        """Trains the index on the buffered vectors and moves them into it."""
+        if self.train_buffer is None or self.index.is_trained:
+            return
+        print(f"Training index on {len(self.train_buffer)} vectors...")
+        self.index.train(self.train_buffer)
+        self.index.add(self.train_buffer)
+        self.train_buffer = None
+
+    def save(self) -> None:
+        write_index(self.index, self.index_path)
+        self._unsaved_batches = 0
+        # With a vector file, buffered training vectors are restored from it instead
+        if self.train_buffer is not None and self.vectors is None:
+            np.save(f"{TRAIN_BUFFER_PATH}.tmp.npy", self.train_buffer)
+            os.replace(f"{TRAIN_BUFFER_PATH}.tmp.npy", TRAIN_BUFFER_PATH)
+        elif os.path.exists(TRAIN_BUFFER_PATH):
+            os.remove(TRAIN_BUFFER_PATH)
+
+
+def migrate_legacy_metadata(jsonl_path: str, store: ArticleStore) -> None:
+    """Copies JSON Lines metadata from an earlier run into the empty article store, keeping row order."""
+    print(f"Migrating article metadata from {jsonl_path} to {store.path}...")
+    batch = []
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) >= EMBEDDING_BATCH_SIZE:
+                store.append(batch)
+                batch = []
+    store.append(batch)
+    os.remove(jsonl_path)
+
+
+def load_checkpoint(query: str) -> Dict[str, Any]:
+    if not os.path.exists(CHECKPOINT_PATH):
+        return {}
+    with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    return checkpoint if checkpoint.get("query") == query else {}
+
+def save_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    tmp_path = f"{CHECKPOINT_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+async def build_index(args: argparse.Namespace):
+    print("--- Starting the indexing process with SentenceTransformers ---")
 
     os.makedirs("data", exist_ok=True)
-    faiss.write_index(index, "data/faiss_index.index")
+    if args.fresh:
+        for path in (settings.VECTOR_INDEX_PATH, settings.VECTOR_METADATA_PATH, settings.VECTOR_FULL_PRECISION_PATH, LEGACY_METADATA_PATH, CHECKPOINT_PATH, TRAIN_BUFFER_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    model = SentenceTransformer(settings.LOCAL_EMBEDDING_MODEL) #replace for medium if u want but latency adjustment required
+    # IVF needs enough vectors per list; SQ8 only learns per-dimension ranges
+    train_size = args.train_size or (40 * args.nlist if args.index_type == "ivfpq" else SQ8_TRAIN_SIZE)
+    indexer = IncrementalIndexer(
+        settings.VECTOR_INDEX_PATH, settings.VECTOR_METADATA_PATH, settings.VECTOR_FULL_PRECISION_PATH, args.index_type,
+        model.get_sentence_embedding_dimension(), args.nlist, args.pq_m, args.hnsw_m, train_size, args.save_interval,
+    )
+
+    # Resume in the exact window the last run stopped in; already indexed PMIDs are skipped either way
+    checkpoint = load_checkpoint(args.query)
+    mindate = datetime.strptime(checkpoint.get("window_start", args.mindate), DATE_FORMAT).date()
+    maxdate = datetime.strptime(args.maxdate, DATE_FORMAT).date() if args.maxdate else date.today()
+    if checkpoint:
+        window = f"{checkpoint['window_start']} - {checkpoint['window_end']}" if checkpoint.get("window_end") else f"starting {checkpoint['window_start']}"
+        print(f"Resuming from window {window} at offset {checkpoint['retstart']}.")
+
+    indexed_this_run = 0
+    pending: List[Dict[str, Any]] = []
 
-    with open("data/indexed_articles.json", "w", encoding="utf-8") as f:
-        json.dump(articles_to_index, f, ensure_ascii=False, indent=4)
-    print("Metadata saved successfully.")
+    async def flush_pending():
+        nonlocal indexed_this_run, pending
+        if not pending:
+            return
+        embeddings = model.encode([a["abstract"] for a in pending], batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        indexer.add(pending, embeddings.astype(np.float32))
+        indexed_this_run += len(pending)
+        print(f"Indexed {indexed_this_run} new articles ({indexer.row_count} total).")
+        pending = []
 
+    async for start, end, webenv, query_key, count in resume_date_windows(args.query, checkpoint, mindate, maxdate):
+        window_start, window_end = start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)
+        in_checkpoint_window = checkpoint.get("window_start") == window_start and checkpoint.get("window_end") == window_end
+        retstart = checkpoint.get("retstart", 0) if in_checkpoint_window else 0
+        print(f"Window {window_start} - {window_end}: {count} records.")
+        while retstart < count:
+            articles = await fetch_history_batch(webenv, query_key, retstart, EFETCH_BATCH_SIZE)
+            pending.extend(indexer.new_articles(articles))
+            if args.max_articles and indexed_this_run + len(pending) >= args.max_articles:
+                pending = pending[:args.max_articles - indexed_this_run]
+                await flush_pending()
+                indexer.save()
+                # Part of this page may be unindexed, so the next run starts from the same page
+                save_checkpoint({"query": args.query, "window_start": window_start, "window_end": window_end, "retstart": retstart})
+                print(f"Reached the limit of {args.max_articles} articles for this run.")
+                return
+            retstart += EFETCH_BATCH_SIZE
+            if len(pending) >= args.batch_size:
+                await flush_pending()
+                save_checkpoint({"query": args.query, "window_start": window_start, "window_end": window_end, "retstart": retstart})
+        await flush_pending()
+        # Without a window_end, the next run splits the remaining range afresh
+        save_checkpoint({"query": args.query, "window_start": (end + timedelta(days=1)).strftime(DATE_FORMAT), "retstart": 0})
+
+    if not indexer.index.is_trained:
+        # IVF needs at least one vector per list; SQ8 can train on any sample
+        min_train_size = args.nlist if isinstance(indexer.index, faiss.IndexIVF) else 1
+        if indexer.train_buffer is not None and len(indexer.train_buffer) >= min_train_size:
+            indexer.train()
+        else:
+            print("Not enough vectors to train the index yet; they stay buffered until the next run.")
+    indexer.save()
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
     print("\n ccheing complete! ---")
 
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build or extend the local FAISS index of PubMed abstracts.")
+    parser.add_argument("--query", default=INDEXING_QUERY, help="PubMed query selecting the articles to index.")
+    parser.add_argument("--max-articles", type=int, default=NUM_ARTICLES_TO_INDEX, help="Maximum new articles to index in this run (0 for no limit).")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index type used when creating a new index; sq8 and binary are re-scored exactly at query time.")
+    parser.add_argument("--nlist", type=int, default=1024, help="Number of IVF lists for the ivfpq index.")
+    parser.add_argument("--pq-m", type=int, default=16, help="Number of PQ sub-quantizers for the ivfpq index (must divide the embedding dimension).")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="Neighbours per node for the hnsw index.")
+    parser.add_argument("--train-size", type=int, default=0, help=f"Vectors to collect before training an ivfpq or sq8 index (default: 40 * nlist for ivfpq, {SQ8_TRAIN_SIZE} for sq8).")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Articles per embedding batch; the article store and vector file are checkpointed after each batch.")
+    parser.add_argument("--save-interval", type=int, default=INDEX_SAVE_INTERVAL, help="Embedding batches between rewrites of the index file; it is always written at the end of a run.")
+    parser.add_argument("--mindate", default=EARLIEST_PUBLICATION_DATE, help="Earliest publication date to index (YYYY/MM/DD).")
+    parser.add_argument("--maxdate", default=None, help="Latest publication date to index (YYYY/MM/DD, default: today).")
+    parser.add_argument("--fresh", action="store_true", help="Delete the existing index, metadata and checkpoint before indexing.")
+    return parser.parse_args(argv)
+
+async def main(args: argparse.Namespace):
+    try:
+        await build_index(args)
+    finally:
+        await close_http_client()
+
 if __name__ == "__main__":
-    asyncio.run(build_index())
\ No newline at end of file
+    asyncio.run(main(parse_args()))